@@ -1,12 +1,47 @@
-import requests
-from bs4 import BeautifulSoup
+import http_client
+from metrics import SCRAPER_STRATEGY
+from source_health import report_empty_page
+from html_parsing import make_soup, iter_script_bodies, decode_object_after, compile_spec, extract
+from price_parsing import parse_price, first_number, first_int
 import random
 import re
-import json
 import time
+import soupsieve
+
+SEARCH_DATA_RE = re.compile(rb'data\s*=\s*(?=\{)')
+
+# Candidates returned per search; ranking and paging happen after the fan-out
+MAX_CANDIDATES = 10
+
+CARD_PATTERN = soupsieve.compile("[data-component-type='s-search-result'], .s-result-item")
+# Fields every result path reads
+BASIC_CARD_FIELDS = {
+    "title": {"select": ["h2 a span", ".a-text-normal"]},
+    "link": {"select": ["h2 a", ".a-link-normal"], "get": ["href"], "default": "#"},
+    "price": {"select": [".a-price .a-offscreen", ".a-price"], "default": "Price not available"}
+}
+BASIC_CARD_SPEC = compile_spec(BASIC_CARD_FIELDS)
+CARD_SPEC = compile_spec(dict(BASIC_CARD_FIELDS, **{
+    "sponsored": {"select": [".s-sponsored-label"], "get": ["element"]},
+    "rating": {"select": ["i.a-icon-star-small, i.a-icon-star"], "post": first_number, "default": 0},
+    "review_count": {"select": [".a-size-base.s-underline-text"], "post": first_int, "default": 0},
+    "prime": {"select": [".s-prime"], "get": ["element"]}
+}))
+
+def _find_search_data(raw):
+    """Decode the `data = {...}` blob of the first search-result script in the raw page."""
+    for body in iter_script_bodies(raw, b"text/javascript"):
+        if b"asin" in body and b"search-result" in body:
+            data = decode_object_after(body, SEARCH_DATA_RE)
+            if data is not None:
+                return data
+    return None
 
 def search_amazon(encoded_query, query, user_agents, logger):
     amazon_results = []
+    strategy = None
+    # The page came back and parsed; if it listed nothing, the medicine just is not stocked
+    answered = False
     try:
         amazon_url = f"https://www.amazon.in/s?k={encoded_query}+medicine&s=relevanceblender"
         headers = {
@@ -17,23 +52,13 @@ def search_amazon(encoded_query, query, user_agents, logger):
             "Pragma": "no-cache"
         }
         
-        response = requests.get(amazon_url, headers=headers, timeout=10)
+        response = http_client.get(amazon_url, headers=headers, timeout=10)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            # Look for embedded JSON data first (more reliable)
-            script_data = None
-            for script in soup.find_all("script", {"type": "text/javascript"}):
-                if script.string and "asin" in script.string and "search-result" in script.string:
-                    try:
-                        json_matches = re.search(r'data\s*=\s*({.*?});', script.string, re.DOTALL)
-                        if json_matches:
-                            script_data = json.loads(json_matches.group(1))
-                            break
-                    except Exception as e:
-                        logger.error(f"Error parsing script JSON: {str(e)}")
+            # Look for embedded JSON data first (more reliable). It is read straight
+            # from the raw bytes; a DOM is only built if this yields nothing.
+            script_data = _find_search_data(response.content)
             
-            if script_data and "asinMetadataResults" in script_data:
+            if isinstance(script_data, dict) and "asinMetadataResults" in script_data:
                 metadata = script_data["asinMetadataResults"]
                 found_products = []
                 for asin, product_data in metadata.items():
@@ -45,9 +70,7 @@ def search_amazon(encoded_query, query, user_agents, logger):
                         review_count = product_data.get("reviewCount", 0) or 0
                         raw_price = 0
                         if price_text != "Price not available":
-                            price_match = re.search(r'₹\s*(\d+[,\d]*\.?\d*)', price_text)
-                            if price_match:
-                                raw_price = float(price_match.group(1).replace(',', ''))
+                            raw_price = parse_price(price_text)["sale_price"] or 0
                         popularity = rating * (review_count or 1)
                         relevance_score = 0
                         medicine_terms = ["medicine", "tablet", "capsule", "syrup", "drug", "pharma", "health", "medical", "dose", "mg"]
@@ -69,59 +92,33 @@ def search_amazon(encoded_query, query, user_agents, logger):
                     except Exception as e:
                         logger.error(f"Error processing Amazon JSON data: {str(e)}")
                 found_products.sort(key=lambda x: (x.get("relevance", 0) + x.get("popularity", 0)), reverse=True)
-                for product in found_products[:5]:
-                    product.pop("popularity", None)
-                    product.pop("relevance", None)
-                    amazon_results.append(product)
+                amazon_results.extend(found_products[:MAX_CANDIDATES])
+                strategy = "json"
             
             if not amazon_results:
-                product_cards = soup.select("[data-component-type='s-search-result'], .s-result-item")
+                soup = make_soup(response.text, "amazon_search")
+                product_cards = CARD_PATTERN.select(soup)
                 all_products = []
-                for card in product_cards[:10]:
+                for card in product_cards[:MAX_CANDIDATES]:
                     try:
-                        sponsored_tag = card.select_one(".s-sponsored-label")
-                        if sponsored_tag:
+                        # One pass of the compiled card spec collects every field
+                        fields = extract(card, CARD_SPEC)
+                        if fields["sponsored"] is not None:
                             continue
-                        title_elem = card.select_one("h2 a span") or card.select_one(".a-text-normal")
-                        title = title_elem.get_text(strip=True) if title_elem else "Unknown Product"
+                        title = fields["title"] or "Unknown Product"
                         lower_title = title.lower()
                         is_medicine = any(term in lower_title for term in ["medicine", "tablet", "capsule", "syrup", "drug", "pharma", "health", "medical", "dose", "mg"])
                         if not is_medicine and query.lower() not in lower_title:
                             continue
-                        link_elem = card.select_one("h2 a") or card.select_one(".a-link-normal")
-                        link = link_elem.get("href", "#") if link_elem else "#"
+                        link = fields["link"]
                         if link.startswith("/"):
                             link = "https://www.amazon.in" + link
-                        price_elem = card.select_one(".a-price .a-offscreen") or card.select_one(".a-price")
-                        price = price_elem.get_text(strip=True) if price_elem else "Price not available"
+                        price = fields["price"]
                         raw_price = 0
                         if price != "Price not available":
-                            price_match = re.search(r'₹\s*(\d+[,\d]*\.?\d*)', price)
-                            if price_match:
-                                try:
-                                    raw_price = float(price_match.group(1).replace(',', ''))
-                                except ValueError:
-                                    raw_price = 0
-                        rating = 0
-                        review_count = 0
-                        rating_elem = card.select_one("i.a-icon-star-small, i.a-icon-star")
-                        if rating_elem:
-                            rating_text = rating_elem.get_text(strip=True)
-                            rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-                            if rating_match:
-                                try:
-                                    rating = float(rating_match.group(1))
-                                except ValueError:
-                                    rating = 0
-                        review_elem = card.select_one(".a-size-base.s-underline-text")
-                        if review_elem:
-                            review_text = review_elem.get_text(strip=True)
-                            review_match = re.search(r'(\d+[,\d]*)', review_text)
-                            if review_match:
-                                try:
-                                    review_count = int(review_match.group(1).replace(',', ''))
-                                except ValueError:
-                                    review_count = 0
+                            raw_price = parse_price(price)["sale_price"] or 0
+                        rating = fields["rating"]
+                        review_count = fields["review_count"]
                         popularity = rating * (review_count or 1)
                         relevance_score = 0
                         for term in ["medicine", "tablet", "capsule", "syrup", "drug", "pharma", "health", "medical", "dose", "mg"]:
@@ -129,8 +126,7 @@ def search_amazon(encoded_query, query, user_agents, logger):
                                 relevance_score += 10
                         if query.lower() in lower_title:
                             relevance_score += 50
-                        prime_badge = card.select_one(".s-prime")
-                        if prime_badge:
+                        if fields["prime"] is not None:
                             relevance_score += 5
                         all_products.append({
                             "source": "Amazon",
@@ -145,28 +141,24 @@ def search_amazon(encoded_query, query, user_agents, logger):
                         logger.error(f"Error parsing Amazon product card: {str(e)}")
                         continue
                 all_products.sort(key=lambda x: (x.get("relevance", 0) + x.get("popularity", 0)), reverse=True)
-                for product in all_products[:5]:
-                    product.pop("popularity", None)
-                    product.pop("relevance", None)
-                    amazon_results.append(product)
+                amazon_results.extend(all_products[:MAX_CANDIDATES])
+                strategy = "cards"
                 
                 if not amazon_results:
                     basic_results = []
                     for card in product_cards:
                         try:
-                            title_elem = card.select_one("h2 a span") or card.select_one(".a-text-normal")
-                            if not title_elem:
+                            fields = extract(card, BASIC_CARD_SPEC)
+                            if fields["title"] is None:
                                 continue
-                            title = title_elem.get_text(strip=True)
+                            title = fields["title"]
                             lower_title = title.lower()
                             if not (query.lower() in lower_title or any(term in lower_title for term in ["medicine", "tablet", "capsule", "syrup", "health"])):
                                 continue
-                            link_elem = card.select_one("h2 a") or card.select_one(".a-link-normal")
-                            link = link_elem.get("href", "#") if link_elem else "#"
+                            link = fields["link"]
                             if link.startswith("/"):
                                 link = "https://www.amazon.in" + link
-                            price_elem = card.select_one(".a-price .a-offscreen") or card.select_one(".a-price")
-                            price = price_elem.get_text(strip=True) if price_elem else "Price not available"
+                            price = fields["price"]
                             basic_results.append({
                                 "source": "Amazon",
                                 "title": title,
@@ -176,27 +168,28 @@ def search_amazon(encoded_query, query, user_agents, logger):
                             })
                         except Exception:
                             continue
-                    amazon_results.extend(basic_results[:5])
+                    amazon_results.extend(basic_results[:MAX_CANDIDATES])
+                    strategy = "basic_cards"
+            answered = True
         else:
             logger.error(f"Amazon returned status code: {response.status_code}")
             try:
                 fallback_url = f"https://www.amazon.in/s?field-keywords={encoded_query}+medicine"
-                response = requests.get(fallback_url, headers=headers, timeout=10)
+                response = http_client.get(fallback_url, headers=headers, timeout=10)
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, "html.parser")
-                    product_cards = soup.select("[data-component-type='s-search-result'], .s-result-item")
-                    for card in product_cards[:5]:
+                    soup = make_soup(response.text, "amazon_search")
+                    product_cards = CARD_PATTERN.select(soup)
+                    for card in product_cards[:MAX_CANDIDATES]:
                         try:
-                            title_elem = card.select_one("h2 a span") or card.select_one(".a-text-normal")
-                            if not title_elem:
+                            fields = extract(card, BASIC_CARD_SPEC)
+                            if fields["title"] is None:
                                 continue
-                            title = title_elem.get_text(strip=True)
-                            link_elem = card.select_one("h2 a") or card.select_one(".a-link-normal")
-                            link = link_elem.get("href", "#") if link_elem else "#"
+                            title = fields["title"]
+                            link = fields["link"]
                             if link.startswith("/"):
                                 link = "https://www.amazon.in" + link
-                            price_elem = card.select_one(".a-price .a-offscreen") or card.select_one(".a-price")
-                            price = price_elem.get_text(strip=True) if price_elem else "Price not available"
+                            price = fields["price"]
+                            strategy = "fallback_search"
                             amazon_results.append({
                                 "source": "Amazon",
                                 "title": title,
@@ -206,10 +199,16 @@ def search_amazon(encoded_query, query, user_agents, logger):
                             })
                         except Exception:
                             continue
+                    answered = True
             except Exception as e:
                 logger.error(f"Amazon fallback search error: {str(e)}")
     except Exception as e:
         logger.error(f"Amazon search error: {str(e)}")
     
-    amazon_results = amazon_results[:5]
+    amazon_results = amazon_results[:MAX_CANDIDATES]
+    if not amazon_results:
+        strategy = "empty" if answered else "none"
+        if answered:
+            report_empty_page()
+    SCRAPER_STRATEGY.inc(source="Amazon", strategy=strategy)
     return amazon_results
\ No newline at end of file
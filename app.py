@@ -1,19 +1,35 @@
-from flask import Flask, render_template, request, flash, redirect, url_for, session
+from flask import (Flask, render_template, request, flash, redirect, url_for, session, jsonify,
+                   Response, stream_with_context, get_template_attribute, g)
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-import sqlite3
 import os
 import logging
-from urllib.parse import quote_plus, urlparse
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
+import json
+import time
+import click
+from urllib.parse import quote_plus
+from datetime import datetime, timezone
 
 # Import scraping functions from separate files
 from pharmeasy import search_pharmeasy
 from tata1mg import search_tata1mg
 from amazon import search_amazon
 from medicine_routine import medicine_bp
+from search_fanout import (fan_out, iter_source_results, cached_results, uncached_sources, search_cache,
+                           MISSING_STATUSES)
+from product_pages import fetch_product_record
+from source_health import SourceHealth
+from price_crawler import PriceCrawler, crawl_once, lookup_prices
+from catalog import lookup_catalog, catalog_writes, ensure_catalog
+from query_normalization import suggest_query
+import http_client
+from response_store import ResponseStore
+from product_matching import match_products
+from ranking import rank_page, score_results, top_k, RANKING_WEIGHTS, RESULTS_PER_PAGE
+import metrics
+import db_pool
+from db_pool import get_db
+from write_behind import queue_write, queue_writes, flush_writes, FLUSH_TIMEOUT
 
 
 # Configure logging
@@ -27,16 +43,33 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
 app.config['DATABASE'] = 'database.db'
+# Overall budget in seconds for one search across all pharmacy sources
+app.config['SEARCH_DEADLINE'] = 12
+# Send the results page shell at once and stream each source's results over SSE
+app.config['SEARCH_STREAMING'] = True
+# Re-scrape the most searched queries in the background (see price_crawler)
+app.config['PRICE_CRAWLER_ENABLED'] = True
+# Raw upstream responses can be kept on disk: 'off', 'record' or 'replay' (offline, store only).
+# Recording costs a compress and a write per fetch, so it is opt-in; recorded
+# responses older than RESPONSE_STORE_MAX_AGE seconds are pruned automatically
+app.config['RESPONSE_STORE_DIR'] = 'response_store'
+app.config['RESPONSE_STORE_MODE'] = 'off'
+app.config['RESPONSE_STORE_MAX_AGE'] = 7 * 24 * 60 * 60
+# Weights of the unified ranking applied to every source's candidates (see ranking.py)
+app.config['RANKING_WEIGHTS'] = dict(RANKING_WEIGHTS)
+app.config['RESULTS_PER_PAGE'] = RESULTS_PER_PAGE
+# Results from each source shown while the stream is still running
+app.config['STREAM_PREVIEW_PER_SOURCE'] = 5
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+http_client.configure_response_store(app.config['RESPONSE_STORE_DIR'], app.config['RESPONSE_STORE_MODE'],
+                                     app.config['RESPONSE_STORE_MAX_AGE'])
 app.register_blueprint(medicine_bp)
-def get_db():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
-    return conn
+# One pooled connection per request, returned at teardown
+db_pool.init_app(app)
 
 def init_db():
     with app.app_context():
@@ -61,6 +94,19 @@ def load_user(user_id):
         return User(user['id'], user['username'], user['password'], user['name'], user['age'])
     return None
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed responses are timed up to the start of the stream
+    started = g.pop('request_started', None)
+    if started is not None and request.endpoint not in (None, 'static', 'metrics_endpoint'):
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint,
+                                        status=response.status_code)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -146,60 +192,122 @@ def logout():
     logout_user()
     return redirect(url_for('index'))
 
-def search_medicine(query):
-    """
-    Multi-source medicine search that returns only real results.
-    """
-    results = []
-    encoded_query = quote_plus(query)
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0"
-    ]
-    
-    search_history_id = None
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0"
+]
+
+# Each source carries its own circuit breaker and adaptive timeout
+SEARCH_SOURCES = [
+    {"name": "PharmEasy", "function": search_pharmeasy, "health": SourceHealth("PharmEasy")},
+    {"name": "Tata 1mg", "function": search_tata1mg, "health": SourceHealth("Tata 1mg")},
+    {"name": "Amazon", "function": search_amazon, "health": SourceHealth("Amazon")}
+]
+
+def search_timestamp():
+    """The time a search started, in the UTC format search_history's CURRENT_TIMESTAMP default uses."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def log_search(query, searched_at, results_count):
+    """Queue the search_history row of a finished search; it is written by the write-behind queue."""
     try:
-        db = get_db()
         if current_user and hasattr(current_user, 'id'):
-            cursor = db.execute(
-                "INSERT INTO search_history (user_id, query) VALUES (?, ?)",
-                (current_user.id, query)
+            queue_write(
+                "INSERT INTO search_history (user_id, query, search_date, results_count) VALUES (?, ?, ?, ?)",
+                (current_user.id, query, searched_at, results_count)
             )
-            search_history_id = cursor.lastrowid
-            db.commit()
     except Exception as e:
         logger.error(f"Failed to log search history: {str(e)}")
+
+def load_local_prices(query):
+    """
+    Results already stored locally for this query, by source: prices the
+    background crawler precomputed, then fresh entries of the product catalog.
+    Only sources missing from the search cache are looked up, and only the
+    sources missing here are scraped.
+    """
+    wanted = uncached_sources(SEARCH_SOURCES, query)
+    if not wanted:
+        return {}
+    db = get_db()
+    local = {}
+    try:
+        local.update((name, results) for name, results in lookup_prices(db, app.config['DATABASE'], query).items()
+                     if name in wanted)
+    except Exception as e:
+        logger.error(f"Failed to read precomputed prices: {str(e)}")
+    try:
+        remaining = [name for name in wanted if name not in local]
+        if remaining:
+            local.update(lookup_catalog(db, app.config['DATABASE'], query, remaining))
+    except Exception as e:
+        logger.error(f"Failed to read product catalog: {str(e)}")
+    return local
+
+def store_catalog_results(query, source_name, results):
+    """Queue freshly scraped results for the product catalog, off the request path."""
+    if not results:
+        return
+    try:
+        ensure_catalog(get_db(), app.config['DATABASE'])
+        for sql, seq_of_params in catalog_writes(query, source_name, results):
+            queue_writes(sql, seq_of_params)
+    except Exception as e:
+        logger.error(f"Failed to update product catalog: {str(e)}")
+
+def gather_results(query):
+    """Every source's candidates for `query`, from the cache, the catalog or a fresh scrape."""
+    return fan_out(SEARCH_SOURCES, quote_plus(query), query, USER_AGENTS, logger,
+                   app.config['SEARCH_DEADLINE'], load_local_prices(query),
+                   on_scraped=lambda name, found: store_catalog_results(query, name, found))
+
+def search_medicine(query):
+    """
+    Multi-source medicine search that returns only real results.
+    All sources are queried concurrently; returns (results, missing_sources)
+    where missing_sources lists the sources that missed the search deadline.
+    """
+    searched_at = search_timestamp()
     
-    all_sources = [
-        {"name": "PharmEasy", "function": search_pharmeasy},
-        {"name": "Tata 1mg", "function": search_tata1mg},
-        {"name": "Amazon", "function": search_amazon}
-    ]
+    with metrics.SEARCH_SECONDS.time():
+        results, missing_sources = gather_results(query)
     
-    for source in all_sources:
-        try:
-            source_results = source["function"](encoded_query, query, user_agents, logger)
-            if source_results:
-                results.extend(source_results)
-            logger.info(f"Found {len(source_results)} results from {source['name']}")
-        except Exception as e:
-            logger.error(f"Error searching {source['name']}: {str(e)}")
-    
-    # Update results count in search history
-    if search_history_id:
-        try:
-            db = get_db()
-            db.execute(
-                "UPDATE search_history SET results_count = ? WHERE id = ?",
-                (len(results), search_history_id)
-            )
-            db.commit()
-        except Exception as e:
-            logger.error(f"Failed to update search history results count: {str(e)}")
+    log_search(query, searched_at, len(results))
     
     logger.info(f"Returning {len(results)} real results")
-    return results
+    if missing_sources:
+        logger.warning(f"Partial results, no answer from: {', '.join(missing_sources)}")
+    return results, missing_sources
+
+def query_suggestion(query):
+    """A spell-corrected form of `query` from the names in the product catalog, or None."""
+    try:
+        ensure_catalog(get_db(), app.config['DATABASE'])
+        return suggest_query(query)
+    except Exception as e:
+        logger.error(f"Failed to suggest a query: {str(e)}")
+        return None
+
+def rank_results(results, query, page=1):
+    return rank_page(results, query, page, app.config['RESULTS_PER_PAGE'], app.config['RANKING_WEIGHTS'])
+
+def render_search(query, page=1):
+    """Render the results page, either as a streaming shell or fully rendered."""
+    if app.config['SEARCH_STREAMING'] and page == 1:
+        return render_template('search_results.html', query=query, results=[], missing_sources=[],
+                               suggestion=query_suggestion(query), stream_url=url_for('search_stream', query=query))
+    if page == 1:
+        results, missing_sources = search_medicine(query)
+    else:
+        # Later pages re-rank the candidates the first page found and never scrape
+        results, missing_sources = cached_results(SEARCH_SOURCES, query, load_local_prices(query))
+        if not results:
+            return redirect(url_for('search', query=query))
+    page_results, page, total_pages = rank_results(results, query, page)
+    return render_template('search_results.html', query=query, results=page_results, total=len(results),
+                           page=page, total_pages=total_pages, missing_sources=missing_sources,
+                           suggestion=query_suggestion(query), groups=match_products(results))
 
 @app.route('/search', methods=['GET', 'POST'])
 @login_required
@@ -210,24 +318,93 @@ def search():
             flash('Please enter a medicine name')
             return redirect(url_for('dashboard'))
         
-        # Save search to history (option for future enhancement)
-        
         # Search for medicines
-        results = search_medicine(query)
-        return render_template('search_results.html', query=query, results=results)
+        return render_search(query)
     
     # Handle GET requests - this supports the clickable popular searches
     query = request.args.get('query', '')
     if query:
-        results = search_medicine(query)
-        return render_template('search_results.html', query=query, results=results)
+        return render_search(query, request.args.get('page', 1, type=int))
     
     # If no query and GET request, redirect to dashboard
     return redirect(url_for('dashboard'))
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/search/stream')
+@login_required
+def search_stream():
+    """Server-Sent Events feed that pushes each source's results as soon as they arrive."""
+    query = request.args.get('query', '')
+    if not query:
+        return jsonify({'error': 'Missing query'}), 400
+    
+    def generate():
+        encoded_query = quote_plus(query)
+        searched_at = search_timestamp()
+        started = time.perf_counter()
+        product_card = get_template_attribute('_product_card.html', 'product_card')
+        price_groups = get_template_attribute('_price_groups.html', 'price_groups')
+        pagination = get_template_attribute('_pagination.html', 'pagination')
+        all_results = []
+        missing_sources = []
+        for name, source_results, status in iter_source_results(SEARCH_SOURCES, encoded_query, query, USER_AGENTS,
+                                                                logger, app.config['SEARCH_DEADLINE'],
+                                                                load_local_prices(query)):
+            if status in MISSING_STATUSES:
+                missing_sources.append(name)
+                continue
+            if status == "ok":
+                store_catalog_results(query, name, source_results)
+            logger.info(f"Found {len(source_results)} results from {name}")
+            all_results.extend(source_results)
+            preview = top_k(score_results(source_results, query, app.config['RANKING_WEIGHTS']),
+                            app.config['STREAM_PREVIEW_PER_SOURCE'])
+            html = "".join(str(product_card(result)) for result in preview)
+            yield sse_event('source', {'source': name, 'count': len(preview), 'html': html})
+        
+        metrics.SEARCH_SECONDS.observe(time.perf_counter() - started)
+        total = len(all_results)
+        log_search(query, searched_at, total)
+        if missing_sources:
+            logger.warning(f"Partial results, no answer from: {', '.join(missing_sources)}")
+        # Ranking and matching need every source, so the first page of merged
+        # results and the comparison are sent with the final event
+        page_results, page, total_pages = rank_results(all_results, query)
+        yield sse_event('done', {'total': total, 'missing_sources': missing_sources,
+                                 'results_html': "".join(str(product_card(result)) for result in page_results),
+                                 'pagination_html': str(pagination(query, page, total_pages)),
+                                 'groups_html': str(price_groups(match_products(all_results)))})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # Stop proxies such as nginx from buffering the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Counters and histograms in the Prometheus text format."""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/search/cache_stats')
+@login_required
+def search_cache_stats():
+    return jsonify(search_cache.stats())
+
+@app.route('/search/source_health')
+@login_required
+def search_source_health():
+    return jsonify({source["name"]: source["health"].snapshot() for source in SEARCH_SOURCES})
+
 @app.route('/clear_search_history')
 @login_required
 def clear_search_history():
     try:
+        # Searches still queued would otherwise be written after the delete
+        if not flush_writes(FLUSH_TIMEOUT):
+            raise RuntimeError("queued searches were not written in time")
         db = get_db()
         db.execute("DELETE FROM search_history WHERE user_id = ?", (current_user.id,))
         db.commit()
@@ -246,150 +423,19 @@ def product_details():
         flash('Invalid product URL or source')
         return redirect(url_for('search'))
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-            "Accept": "text/html"
-        }
-        response = requests.get(product_url, headers=headers, timeout=15)
-        if response.status_code != 200:
-            flash(f"Failed to fetch product details from {source}. Status code: {response.status_code}")
+        record, status_code = fetch_product_record(product_url, source)
+        if record is None:
+            flash(f"Failed to fetch product details from {source}. Status code: {status_code}")
             return redirect(url_for('search'))
-        soup = BeautifulSoup(response.text, 'html.parser')
-        product_name = "Product Name"
-        product_price = "Price not available"
-        product_image = None
-        product_description = "No description available"
-        
-        if source == "PharmEasy":
-            # Enhanced selectors for PharmEasy
-            product_name_elem = soup.select_one(".MedicineOverviewSection_medicineName__dHDQZ, h1.ProductTitle_product-title__OkCXo, h1[class*='product-title'], h1[class*='medicineName'], .medicine-name, .product-title")
-            if product_name_elem:
-                product_name = product_name_elem.get_text(strip=True)
-            
-            price_elem = soup.select_one(".PriceInfo_ourPrice__jFYXr, div[class*='Price'], span[class*='Price'], div[class*='price'], span[class*='price'], div[class*='MRP'], span[class*='MRP']")
-            if price_elem:
-                product_price = price_elem.get_text(strip=True)
-            else:
-                # Fallback: look for any element containing the rupee symbol
-                rupee_elems = soup.find_all(string=lambda s: s and "₹" in s)
-                if rupee_elems:
-                    product_price = rupee_elems[0].strip()
-            
-            img_elem = soup.select_one(".ProductImageCarousel_carousel-img__cJgkZ, .style__image___Sd7O3, img[class*='product'], img[class*='medicine'], .product-image img, .medicine-image img")
-            if img_elem:
-                product_image = img_elem.get("src")
-            
-            desc_elem = soup.select_one(".ProductDescription_product-description__gAYip, .MedicineOverviewSection_medicineOverview__yR8HD, div[class*='description'], div[class*='overview'], div[class*='details'], .product-details")
-            if desc_elem:
-                product_description = desc_elem.get_text(strip=True)
-        
-        elif source == "Tata 1mg":
-            # Enhanced selectors for Tata 1mg
-            product_name_elem = soup.select_one(".DrugHeader__title___2ZZX_ h1, .ProductTitle__product-title___3QMYH, h1[class*='title'], h1[class*='name'], div.DrugHeader__title-content___2ZZX_")
-            if product_name_elem:
-                product_name = product_name_elem.get_text(strip=True)
-            
-            price_elem = soup.select_one(".PriceBoxPlanOption__offer-price___3v_Nd, .ProductPriceBox__price___11Tjr, div[class*='price'], span[class*='price'], div[class*='offer-price']")
-            if price_elem:
-                product_price = price_elem.get_text(strip=True)
-            else:
-                rupee_elems = soup.find_all(string=lambda s: s and "₹" in s)
-                if rupee_elems:
-                    product_price = rupee_elems[0].strip()
-            
-            img_elem = soup.select_one(".ProductImage__image-container___2_MWm img, .style__image-container___2G57K img, img[class*='product'], img.style__product-image___1bkbA")
-            if img_elem:
-                product_image = img_elem.get("src")
-            
-            desc_elem = soup.select_one(".ProductDescription_description-content___A_qCZ, .DrugOverview__content___2ZZX_, div[class*='description'], div[class*='overview']")
-            if desc_elem:
-                product_description = desc_elem.get_text(strip=True)
-        
-        elif source == "Amazon":
-            # Enhanced selectors for Amazon
-            product_name_elem = (soup.select_one("#productTitle, #title, h1") or soup.select_one("title"))
-            if product_name_elem:
-                product_name = product_name_elem.get_text(strip=True)
-                if "Amazon.in" in product_name:
-                    product_name = product_name.split(":", 1)[0].strip()
-            
-            price_elem = (
-                soup.select_one(".a-price .a-offscreen") or 
-                soup.select_one(".a-price") or 
-                soup.select_one("#priceblock_ourprice") or
-                soup.select_one("#priceblock_dealprice") or
-                soup.select_one("#priceblock_saleprice")
-            )
-            if price_elem:
-                product_price = price_elem.get_text(strip=True)
-            else:
-                # Try to find any element with a rupee symbol
-                rupee_elems = soup.find_all(string=lambda s: s and "₹" in s)
-                if rupee_elems:
-                    product_price = rupee_elems[0].strip()
-            
-            img_elem = (
-                soup.select_one("#landingImage") or 
-                soup.select_one("#imgBlkFront") or
-                soup.select_one("img[id*='image'], img[data-old-hires]") or 
-                soup.select_one("img[src*='product'], img[src*='large']") or 
-                soup.select_one("img")
-            )
-            if img_elem:
-                # Get the best quality image URL from Amazon
-                product_image = img_elem.get("data-old-hires") or img_elem.get("src")
-            
-            desc_elem = (
-                soup.select_one("#productDescription") or
-                soup.select_one("#feature-bullets") or
-                soup.select_one(".product-description") or
-                soup.select_one("[id$='-description']")
-            )
-            if desc_elem:
-                product_description = desc_elem.get_text(strip=True)
-        
-        # Generic fallbacks for missing data
-        if not product_name or product_name == "Product Name":
-            title_elem = (soup.select_one("h1") or soup.select_one("title"))
-            if title_elem:
-                product_name = title_elem.get_text(strip=True)
         
-        if not product_image:
-            img_elem = (soup.select_one("img[src*='product'], img[src*='large']") or soup.select_one("img"))
-            if img_elem:
-                product_image = img_elem.get("src")
-                if product_image and not product_image.startswith(("http://", "https://")):
-                    parsed_url = urlparse(product_url)
-                    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                    product_image = base_url + product_image if not product_image.startswith("/") else base_url + product_image
-        
-        # Try to extract better descriptions
-        if product_description == "No description available" or len(product_description) < 50:
-            # Look for any other elements that might contain descriptions
-            for selector in ["meta[name='description']", "meta[property='og:description']", ".product-description", 
-                           "[class*='description']", "[class*='info']", "[class*='detail']"]:
-                desc_elem = soup.select_one(selector)
-                if desc_elem:
-                    if selector.startswith("meta"):
-                        content = desc_elem.get("content", "")
-                        if content and len(content) > len(product_description):
-                            product_description = content
-                    else:
-                        text = desc_elem.get_text(strip=True)
-                        if text and len(text) > len(product_description):
-                            product_description = text
-                    
-                    if product_description != "No description available" and len(product_description) > 50:
-                        break
-        
-        # Get current time for the "Last Updated" field
-        current_time = datetime.now().strftime("%B %d, %Y at %I:%M %p")
+        # "Last Updated" is when the record was last fetched, which may be a cached copy
+        current_time = record["fetched_at"].strftime("%B %d, %Y at %I:%M %p")
         
         return render_template('product_details.html',
-                               product_name=product_name,
-                               product_price=product_price,
-                               product_image=product_image,
-                               product_description=product_description,
+                               product_name=record["name"],
+                               product_price=record["price"],
+                               product_image=record["image"],
+                               product_description=record["description"],
                                source=source,
                                original_url=product_url,
                                current_time=current_time,
@@ -446,9 +492,26 @@ def simulated_product():
                            current_time=datetime.now().strftime("%B %d, %Y at %I:%M %p"),
                            simulated=True)
 
+@app.cli.command('crawl-prices')
+def crawl_prices_command():
+    """Refresh precomputed prices for the most searched queries once (for cron)."""
+    stored = crawl_once(app.config['DATABASE'], SEARCH_SOURCES, USER_AGENTS)
+    print(f"Stored {stored} source results")
+
+@app.cli.command('prune-responses')
+@click.option('--days', default=7, help='Drop stored responses fetched more than this many days ago.')
+def prune_responses_command(days):
+    """Remove old entries from the raw response store."""
+    store = ResponseStore(app.config['RESPONSE_STORE_DIR'])
+    print(f"Removed {store.prune(days * 24 * 60 * 60)} stored responses")
+
 if __name__ == '__main__':
     if not os.path.exists(app.config['DATABASE']):
         init_db()
     if not os.path.exists('logs'):
         os.makedirs('logs')
+    # The debug reloader runs this block in both the watcher and the serving
+    # process; only the serving process should crawl.
+    if app.config['PRICE_CRAWLER_ENABLED'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        PriceCrawler(app.config['DATABASE'], SEARCH_SOURCES, USER_AGENTS).start()
     app.run(debug=True)
\ No newline at end of file
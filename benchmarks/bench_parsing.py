@@ -0,0 +1,68 @@
+"""
+Compare parse time and peak memory of the old html.parser path against the
+lxml + SoupStrainer path used by the scrapers.
+
+Usage: python benchmarks/bench_parsing.py [page.html] [strainer] [rounds]
+Defaults to the recorded amazon_response.html and the amazon_search strainer.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bs4 import BeautifulSoup
+from html_parsing import make_soup
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CARD_SELECTORS = {
+    "amazon_search": "[data-component-type='s-search-result'], .s-result-item",
+    "tata1mg_search": ".style__product-box___3oEU6, .style__horizontal-card___1Zwmt",
+    "pharmeasy_search": "[data-test='product-card'], div[class*='ProductCard_']"
+}
+
+
+def measure(parse, markup, rounds):
+    """Return (best parse time in seconds, peak traced memory in bytes, soup)."""
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        soup = parse(markup)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    soup = parse(markup)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, soup
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "amazon_response.html")
+    strainer = sys.argv[2] if len(sys.argv) > 2 else "amazon_search"
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    with open(path, encoding="utf-8") as f:
+        markup = f.read()
+
+    candidates = [
+        ("html.parser (full tree)", lambda m: BeautifulSoup(m, "html.parser")),
+        ("lxml (full tree)", lambda m: make_soup(m)),
+        (f"lxml + {strainer}", lambda m: make_soup(m, strainer))
+    ]
+
+    print(f"{os.path.basename(path)}: {len(markup) / 1024:.0f} KiB, best of {rounds} rounds")
+    print(f"{'parser':<32}{'parse ms':>10}{'peak MiB':>10}{'cards':>8}")
+    baseline = None
+    for label, parse in candidates:
+        seconds, peak, soup = measure(parse, markup, rounds)
+        cards = len(soup.select(CARD_SELECTORS[strainer])) if strainer in CARD_SELECTORS else "-"
+        baseline = baseline or seconds
+        print(f"{label:<32}{seconds * 1000:>10.1f}{peak / 1024 / 1024:>10.1f}{cards:>8}"
+              f"   x{baseline / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
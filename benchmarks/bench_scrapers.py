@@ -0,0 +1,131 @@
+"""
+Offline scraper benchmark against recorded pages served by a local stand-in.
+
+Times search_pharmeasy, search_tata1mg, search_amazon and end-to-end
+search_medicine and reports throughput, p50/p95/p99 latency and peak RSS.
+
+Usage: python benchmarks/bench_scrapers.py --iterations 50 --concurrency 4 \
+           --latency-ms 80 --jitter-ms 40 --error-rate 0.05
+"""
+import argparse
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from standin_server import StandInServer, mount_stand_in
+
+QUERY = "dolo 650"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def peak_rss_mib():
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(call, iterations, concurrency):
+    """Run `call` `iterations` times on `concurrency` threads; return (latencies, wall time, empty runs)."""
+    def timed(_):
+        started = time.perf_counter()
+        results = call()
+        return time.perf_counter() - started, not results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - started
+    return sorted(latency for latency, _ in samples), wall, sum(1 for _, empty in samples if empty)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=50, help="added latency per upstream response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="+/- uniform jitter on the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses turned into 503s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", choices=["pharmeasy", "tata1mg", "amazon", "search_medicine"], action="append",
+                        help="benchmark only these targets (repeatable)")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="let search_medicine serve from the result cache instead of clearing it per call")
+    parser.add_argument("--response-store", choices=["off", "record"],
+                        help="response store mode to measure (default: the app's RESPONSE_STORE_MODE)")
+    parser.add_argument("--verbose", action="store_true", help="keep application logging enabled")
+    args = parser.parse_args()
+
+    # Importing app sets up logging to app.log, which the benchmark must not flood
+    import app as mediprice
+    import http_client
+    from pharmeasy import search_pharmeasy
+    from tata1mg import search_tata1mg
+    from amazon import search_amazon
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    logger = logging.getLogger("bench")
+
+    server = StandInServer(args.latency_ms, args.jitter_ms, args.error_rate, args.seed).start()
+    mount_stand_in(server)
+
+    # search_medicine reads and writes the product catalog; keep that out of database.db
+    scratch = tempfile.TemporaryDirectory()
+
+    # Measure the response store setting the app ships with, recording into the scratch directory
+    http_client.configure_response_store(os.path.join(scratch.name, "responses"),
+                                         args.response_store or mediprice.app.config['RESPONSE_STORE_MODE'],
+                                         mediprice.app.config['RESPONSE_STORE_MAX_AGE'])
+    mediprice.app.config['DATABASE'] = os.path.join(scratch.name, "bench.db")
+    mediprice.init_db()
+
+    encoded_query = quote_plus(QUERY)
+    user_agents = mediprice.USER_AGENTS
+
+    def end_to_end():
+        with mediprice.app.test_request_context():
+            if not args.warm_cache:
+                mediprice.search_cache.clear()
+                db = mediprice.get_db()
+                db.execute("DELETE FROM catalog_queries")
+                db.commit()
+            results, _ = mediprice.search_medicine(QUERY)
+        return results
+
+    targets = {
+        "pharmeasy": lambda: search_pharmeasy(encoded_query, QUERY, user_agents, logger),
+        "tata1mg": lambda: search_tata1mg(encoded_query, QUERY, user_agents, logger),
+        "amazon": lambda: search_amazon(encoded_query, QUERY, user_agents, logger),
+        "search_medicine": end_to_end
+    }
+
+    print(f"stand-in at {server.base_url}: latency {args.latency_ms}ms +/- {args.jitter_ms}ms, "
+          f"error rate {args.error_rate:.0%}, {args.iterations} iterations x {args.concurrency} threads")
+    print(f"{'target':<18}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'empty':>7}{'peak RSS MiB':>14}")
+    try:
+        for name in args.only or targets:
+            latencies, wall, empty = run_benchmark(targets[name], args.iterations, args.concurrency)
+            print(f"{name:<18}{args.iterations / wall:>8.1f}"
+                  f"{percentile(latencies, 50) * 1000:>9.1f}{percentile(latencies, 95) * 1000:>9.1f}"
+                  f"{percentile(latencies, 99) * 1000:>9.1f}{empty:>7}{peak_rss_mib():>14.1f}")
+    finally:
+        server.stop()
+        scratch.cleanup()
+    print(f"upstream requests served: {server.requests_served}, errors injected: {server.errors_injected}")
+
+
+if __name__ == "__main__":
+    main()
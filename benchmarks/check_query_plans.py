@@ -0,0 +1,116 @@
+"""
+Check that the medicine routine queries never fully scan a table, and time
+the routine index page's dashboard query against a large notification history.
+
+Builds a scratch database from schema.sql, fills it with --users users whose
+routines have --days days of stored taken/skipped/sent occurrences, runs
+ANALYZE and prints EXPLAIN QUERY PLAN for every checked statement. Exits
+with status 1 if any plan contains a SCAN that does not use an index.
+
+Usage: python benchmarks/check_query_plans.py [--users 50] [--days 90] [--rounds 20]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from medicine_routine import DASHBOARD_QUERY, OCCURRENCE_STATUS_QUERY
+from recurrence import format_occurrence
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def build_database(path, users, days, seed):
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    with open(os.path.join(ROOT, "schema.sql")) as f:
+        db.executescript(f.read())
+    start = datetime.now().replace(second=0, microsecond=0) - timedelta(days=days)
+    for user_id in range(1, users + 1):
+        db.execute("INSERT INTO users (id, username, password, name, age) VALUES (?, ?, '', '', 30)",
+                   (user_id, f"user{user_id}"))
+        for _ in range(3):
+            routine_id = db.execute(
+                """INSERT INTO medicine_routines (user_id, medicine_name, priority, start_date)
+                   VALUES (?, ?, 'High', ?)""",
+                (user_id, f"medicine {rng.randint(1, 500)}", start.strftime('%Y-%m-%d'))
+            ).lastrowid
+            dose_id = db.execute(
+                """INSERT INTO medicine_doses (routine_id, time_of_day, frequency_hours, dosage, active_from)
+                   VALUES (?, '08:00', 8, '1 tablet', ?)""",
+                (routine_id, format_occurrence(start))
+            ).lastrowid
+            db.executemany(
+                """INSERT INTO notifications (user_id, routine_id, dose_id, scheduled_time, status)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [(user_id, routine_id, dose_id,
+                  format_occurrence(start + timedelta(days=day, hours=8 + 8 * slot)),
+                  rng.choice(("taken", "taken", "skipped", "sent")))
+                 for day in range(days) for slot in range(3)]
+            )
+    db.commit()
+    db.execute("ANALYZE")
+    return db
+
+
+def full_scans(db, sql, params):
+    plan = [row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    return plan, [detail for detail in plan if detail.startswith("SCAN ") and " USING " not in detail]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    try:
+        db = build_database(os.path.join(scratch.name, "plans.db"), args.users, args.days, args.seed)
+        now = datetime.now().replace(second=0, microsecond=0)
+        today_start = now.replace(hour=0, minute=0)
+        window = {
+            'user_id': 1,
+            'window_start': format_occurrence(min(today_start, now - timedelta(hours=24))),
+            'window_end': format_occurrence(today_start + timedelta(days=1)),
+            'today_start': format_occurrence(today_start)
+        }
+        checks = [
+            ("dashboard", DASHBOARD_QUERY, window),
+            ("occurrence statuses", OCCURRENCE_STATUS_QUERY, (1, window['window_start'], window['window_end'])),
+            ("edit: drop retired occurrences", "DELETE FROM notifications WHERE dose_id = ? AND scheduled_time >= ?",
+             (1, window['today_start'])),
+            ("delete routine", "DELETE FROM notifications WHERE routine_id = ?", (1,))
+        ]
+        rows = db.execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+        print(f"{rows} stored occurrences for {args.users} users")
+        failed = False
+        for label, sql, params in checks:
+            plan, scans = full_scans(db, sql, params)
+            print(f"\n{label}{'  FULL SCAN' if scans else ''}")
+            for detail in plan:
+                print(f"    {detail}")
+            failed = failed or bool(scans)
+
+        best = float("inf")
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            db.execute(DASHBOARD_QUERY, window).fetchall()
+            best = min(best, time.perf_counter() - started)
+        print(f"\ndashboard query: best of {args.rounds} rounds {best * 1000:.2f} ms")
+        db.close()
+    finally:
+        scratch.cleanup()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
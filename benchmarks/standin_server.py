@@ -0,0 +1,134 @@
+"""
+Local stand-in for the pharmacy sites, serving recorded pages with
+configurable latency and error injection.
+
+StandInServer serves /<host><path> from the fixtures below. mount_stand_in()
+points the shared http_client session at it, so the real scrapers run
+unchanged against recorded responses instead of the live sites.
+"""
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+import http_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, "..")
+
+# (host, path) -> (fixture file, content type)
+FIXTURES = {
+    ("pharmeasy.in", "/api/search/search"): (os.path.join(BENCH_DIR, "fixtures", "pharmeasy_api.json"),
+                                             "application/json; charset=utf-8"),
+    ("www.1mg.com", "/search/all"): (os.path.join(BENCH_DIR, "fixtures", "tata1mg_search.html"),
+                                     "text/html; charset=utf-8"),
+    ("www.amazon.in", "/s"): (os.path.join(ROOT, "amazon_response.html"), "text/html; charset=utf-8")
+}
+
+STAND_IN_HOSTS = sorted({host for host, _ in FIXTURES})
+
+
+class StandInServer:
+    """Threaded HTTP server replaying FIXTURES on 127.0.0.1."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests_served = 0
+        self.errors_injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bodies = {}
+        for key, (path, content_type) in FIXTURES.items():
+            with open(path, "rb") as f:
+                self._bodies[key] = (f.read(), content_type)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, delayed
+            # ACKs add ~40 ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                host, _, path = self.path.lstrip("/").partition("/")
+                path = "/" + path.split("?", 1)[0]
+                delay, fail = stand_in._next_behaviour()
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    self._send(503, b"injected error", "text/plain")
+                    return
+                fixture = stand_in._bodies.get((host, path))
+                if fixture is None:
+                    self._send(404, b"not recorded", "text/plain")
+                    return
+                self._send(200, *fixture)
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _next_behaviour(self):
+        with self._lock:
+            self.requests_served += 1
+            delay = self.latency_ms
+            if self.jitter_ms:
+                delay += self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors_injected += 1
+        return max(delay, 0) / 1000, fail
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StandInAdapter(HTTPAdapter):
+    """Transport adapter that rewrites https://<host>/<path> to the stand-in server."""
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = f"{self.base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+def mount_stand_in(server):
+    """Route every request for the pharmacy hosts through `server`, keeping the retry policy."""
+    retries = http_client.session.get_adapter("https://").max_retries
+    adapter = StandInAdapter(server.base_url, pool_connections=http_client.POOL_HOSTS,
+                             pool_maxsize=http_client.POOL_SIZE_PER_HOST, max_retries=retries)
+    for host in STAND_IN_HOSTS:
+        http_client.session.mount(f"https://{host}/", adapter)
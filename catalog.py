@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime, timedelta
+
+from query_normalization import canonical_query, medicine_names
+
+logger = logging.getLogger(__name__)
+
+# A source's catalog entries for a query are served without scraping for this long
+MAX_CATALOG_AGE = timedelta(hours=6)
+RESULTS_PER_SOURCE = 10
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    price TEXT,
+    raw_price REAL,
+    scraped_at TIMESTAMP NOT NULL,
+    UNIQUE (source, link)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    title, content='products', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts(rowid, title) VALUES (new.id, new.title);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE OF title ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO products_fts(rowid, title) VALUES (new.id, new.title);
+END;
+
+CREATE TABLE IF NOT EXISTS catalog_queries (
+    query_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    scraped_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (query_key, source)
+);
+"""
+
+_ready_databases = set()
+
+
+def ensure_catalog(db, database):
+    """Create the catalog tables once per database file and index the names already in it."""
+    if database in _ready_databases:
+        return
+    db.executescript(CATALOG_SCHEMA)
+    for row in db.execute("SELECT title FROM products"):
+        medicine_names.add_text(row['title'])
+    _ready_databases.add(database)
+
+
+def fts_query(query):
+    """
+    Turn a search query into an FTS5 query matching titles that contain every
+    term as a prefix, so "dolo 650" also finds "Dolo 650mg".
+    """
+    terms = [term.replace('"', '') for term in canonical_query(query).split()]
+    return " ".join(f'"{term}"*' for term in terms if term)
+
+
+def lookup_catalog(db, database, query, sources):
+    """
+    Return {source: results} for the sources among `sources` that were
+    scraped for this query within MAX_CATALOG_AGE and have matching titles
+    scraped within that time too.
+    """
+    ensure_catalog(db, database)
+    match = fts_query(query)
+    if not match:
+        return {}
+    cutoff = (datetime.now() - MAX_CATALOG_AGE).strftime('%Y-%m-%d %H:%M:%S')
+    fresh_sources = [
+        row['source'] for row in db.execute(
+            "SELECT source FROM catalog_queries WHERE query_key = ? AND scraped_at >= ?",
+            (canonical_query(query), cutoff)
+        ).fetchall()
+        if row['source'] in sources
+    ]
+    found = {}
+    for source in fresh_sources:
+        rows = db.execute(
+            """SELECT p.source, p.title, p.link, p.price, p.raw_price
+               FROM products_fts
+               JOIN products p ON p.id = products_fts.rowid
+               WHERE products_fts MATCH ? AND p.source = ? AND p.scraped_at >= ?
+               ORDER BY products_fts.rank
+               LIMIT ?""",
+            (match, source, cutoff, RESULTS_PER_SOURCE)
+        ).fetchall()
+        if rows:
+            found[source] = [dict(row) for row in rows]
+    return found
+
+
+def catalog_writes(query, source, results):
+    """
+    The (sql, seq_of_params) statements that upsert scraped results into the
+    catalog and mark the source fresh for this query, for a caller to run
+    or queue; the tables must exist (ensure_catalog).
+    """
+    for result in results:
+        medicine_names.add_text(result['title'])
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    writes = [(
+        """INSERT INTO products (source, title, link, price, raw_price, scraped_at)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (source, link) DO UPDATE SET
+               title = excluded.title,
+               price = excluded.price,
+               raw_price = excluded.raw_price,
+               scraped_at = excluded.scraped_at""",
+        [(source, result['title'], result['link'], result.get('price'), result.get('raw_price'), now)
+         for result in results if result.get('link') and result.get('link') != '#']
+    )]
+    query_key = canonical_query(query)
+    if query_key:
+        writes.append((
+            "INSERT OR REPLACE INTO catalog_queries (query_key, source, scraped_at) VALUES (?, ?, ?)",
+            [(query_key, source, now)]
+        ))
+    return writes
+
+
+def record_results(db, database, query, source, results):
+    """Upsert scraped results into the catalog and mark the source fresh for this query."""
+    ensure_catalog(db, database)
+    for sql, seq_of_params in catalog_writes(query, source, results):
+        db.executemany(sql, seq_of_params)
+    db.commit()
@@ -0,0 +1,105 @@
+import queue
+import sqlite3
+import threading
+from flask import current_app, g
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer; synchronous=NORMAL is durable under WAL except on power loss;
+# busy_timeout makes a writer wait for the lock instead of failing at once.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA temp_store=MEMORY"
+)
+
+# Idle connections kept per database and prepared statements cached per connection
+MAX_IDLE_CONNECTIONS = 8
+CACHED_STATEMENTS = 256
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to one database file.
+
+    Connections are created on demand, configured once with PRAGMAS and
+    handed back by release(). Up to `max_idle` of them are kept open for
+    reuse; the rest are closed. A connection is only ever used by one
+    thread at a time, but it may move between threads, so it is opened
+    with check_same_thread=False.
+    """
+
+    def __init__(self, database, max_idle=MAX_IDLE_CONNECTIONS, cached_statements=CACHED_STATEMENTS):
+        self.database = database
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        self.created += 1
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        self.reused += 1
+        return conn
+
+    def release(self, conn):
+        # Work the borrower never committed is dropped, not handed to the next one
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database):
+    """The process-wide pool for `database`."""
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            pool = _pools[database] = ConnectionPool(database)
+        return pool
+
+
+def get_db():
+    """The current app context's connection, taken from the pool on first use."""
+    if 'db' not in g:
+        database = current_app.config['DATABASE']
+        g.db = get_pool(database).acquire()
+        g.db_database = database
+    return g.db
+
+
+def close_db(exception=None):
+    """Return the app context's connection to its pool."""
+    db = g.pop('db', None)
+    if db is not None:
+        get_pool(g.pop('db_database')).release(db)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,164 @@
+import json
+import re
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+from metrics import PARSE_SECONDS
+
+# lxml is several times faster than html.parser and is already a dependency
+PARSER = "lxml"
+
+
+def _class_tokens(attrs):
+    value = attrs.get("class") or ""
+    if isinstance(value, str):
+        return value.split()
+    return value
+
+
+def _class_contains(attrs, *fragments):
+    return any(fragment in token for token in _class_tokens(attrs) for fragment in fragments)
+
+
+def _pharmeasy_search_tags(name, attrs):
+    # Product cards plus the product links used by the last-resort link walk
+    if name == "a":
+        href = attrs.get("href") or ""
+        return "/online-medicine-order/" in href or "product-details" in href
+    return "product" in (attrs.get("data-test") or "") or _class_contains(attrs, "card", "Card")
+
+
+def _tata1mg_search_tags(name, attrs):
+    if name == "script":
+        return attrs.get("type") == "application/json"
+    if attrs.get("data-auto-id") == "product-grid-card":
+        return True
+    return _class_contains(attrs, "style__product-box___", "style__horizontal-card___", "style__product-grid___")
+
+
+def _amazon_search_tags(name, attrs):
+    if name == "script":
+        return attrs.get("type") == "text/javascript"
+    if attrs.get("data-component-type") == "s-search-result":
+        return True
+    return "s-result-item" in _class_tokens(attrs)
+
+
+# Each scraper only needs a few subtrees of the search page. The strainer is
+# checked for top-level tags only, so every matched tag keeps its full subtree.
+STRAINERS = {
+    "pharmeasy_search": SoupStrainer(_pharmeasy_search_tags),
+    "tata1mg_search": SoupStrainer(_tata1mg_search_tags),
+    "amazon_search": SoupStrainer(_amazon_search_tags)
+}
+
+
+def make_soup(markup, strainer=None):
+    """
+    Parse `markup` with lxml. `strainer` names an entry of STRAINERS to build
+    only the subtrees that page type needs; None builds the whole document.
+    """
+    parse_only = STRAINERS[strainer] if strainer else None
+    with PARSE_SECONDS.time(page=strainer or "document"):
+        return BeautifulSoup(markup, PARSER, parse_only=parse_only)
+
+
+# Declarative extraction. A spec maps each field to
+#   "select":   ordered selectors; the first one matching an element wins
+#               (a comma-joined group matches in document order, as before)
+#   "get":      ordered list of "text", "element" or attribute names; the first
+#               non-empty value of the matched element is used (default "text")
+#   "fallback": optional callable(tag) used when no selector yields a value
+#   "post":     optional callable applied to the value
+#   "default":  value when nothing is found (default None)
+# compile_spec() compiles the selectors once at import; extract() runs them.
+
+def compile_spec(spec):
+    compiled = []
+    for field, rule in spec.items():
+        compiled.append((
+            field,
+            [soupsieve.compile(selector) for selector in rule.get("select", [])],
+            rule.get("get", ["text"]),
+            rule.get("fallback"),
+            rule.get("post"),
+            rule.get("default")
+        ))
+    return compiled
+
+
+def _element_value(element, getters):
+    for getter in getters:
+        if getter == "element":
+            return element
+        value = element.get_text(strip=True) if getter == "text" else element.get(getter)
+        if value:
+            return value
+    return None
+
+
+def extract(tag, compiled_spec):
+    """Collect every field of a compiled spec from `tag` in one call; returns {field: value}."""
+    record = {}
+    for field, patterns, getters, fallback, post, default in compiled_spec:
+        value = None
+        for pattern in patterns:
+            element = pattern.select_one(tag)
+            if element is not None:
+                value = _element_value(element, getters)
+                break
+        if value is None and fallback:
+            value = fallback(tag)
+        if value is not None and post:
+            value = post(value)
+        record[field] = default if value is None else value
+    return record
+
+
+# Fast path: pull embedded JSON straight out of the raw response bytes and
+# decode only the matched slice, so the happy path never builds a DOM.
+_json_decoder = json.JSONDecoder()
+_SCRIPT_OPEN = {
+    script_type: re.compile(rb"<script\b[^>]*\btype=[\"']" + re.escape(script_type) + rb"[\"'][^>]*>", re.I)
+    for script_type in (b"application/json", b"text/javascript")
+}
+_SCRIPT_CLOSE = re.compile(rb"</script\s*>", re.I)
+
+
+def iter_script_bodies(raw, script_type):
+    """Yield the raw bytes inside every <script type="script_type"> block of `raw`."""
+    for match in _SCRIPT_OPEN[script_type].finditer(raw):
+        close = _SCRIPT_CLOSE.search(raw, match.end())
+        if close is None:
+            return
+        yield raw[match.end():close.start()]
+
+
+def find_json_script(raw, accept):
+    """Return the first <script type="application/json"> payload for which accept(data) is true."""
+    with PARSE_SECONDS.time(page="json_script"):
+        for body in iter_script_bodies(raw, b"application/json"):
+            try:
+                data = json.loads(body)
+            except ValueError:
+                continue
+            if accept(data):
+                return data
+    return None
+
+
+def decode_object_after(raw, pattern, start=0):
+    """
+    Decode the JSON object that directly follows the first match of the
+    compiled bytes `pattern` at or after `start` whose object parses.
+    Only the slice up to the enclosing </script> is decoded.
+    """
+    with PARSE_SECONDS.time(page="embedded_json"):
+        for match in pattern.finditer(raw, start):
+            close = _SCRIPT_CLOSE.search(raw, match.end())
+            chunk = raw[match.end():close.start() if close else len(raw)]
+            try:
+                data, _ = _json_decoder.raw_decode(chunk.decode("utf-8", "replace"))
+            except ValueError:
+                continue
+            return data
+    return None
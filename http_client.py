@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from response_store import ResponseStore, MODES, missing_response
+from metrics import UPSTREAM_FETCH_SECONDS, UPSTREAM_RESPONSE_BYTES, UPSTREAM_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+# Seconds allowed to open a connection; read timeouts are chosen per call
+CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+
+# Number of per-host pools kept alive and connections kept per host
+POOL_HOSTS = 10
+POOL_SIZE_PER_HOST = 10
+
+
+def _build_session():
+    """Create the process-wide session with keep-alive pools and a retry policy."""
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=1,
+        status=2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        backoff_factor=0.3,
+        backoff_jitter=0.2,
+        # Retry-After can ask for minutes and urllib3 would sleep that long, uncapped
+        # by timeout_limit, holding a shared search worker; use the short backoff instead
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE_PER_HOST, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Requests come from many different users, so never carry cookies between them
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+session = _build_session()
+_local = threading.local()
+
+# Raw response store under every get(); see configure_response_store
+_store = None
+_store_mode = "off"
+
+
+def configure_response_store(root, mode, max_age=None):
+    """
+    Put a ResponseStore at `root` underneath every get().
+    "off" disables it, "record" fetches from the network and stores every
+    200 response, "replay" serves only stored responses and never touches
+    the network (missing URLs get a 504). While recording, entries older
+    than `max_age` seconds are pruned automatically.
+    """
+    global _store, _store_mode
+    if mode not in MODES:
+        raise ValueError(f"Unknown response store mode: {mode}")
+    _store = ResponseStore(root, max_age if mode == "record" else None) if mode != "off" else None
+    _store_mode = mode
+
+
+def _record(host, origin, response, started):
+    UPSTREAM_FETCH_SECONDS.observe(time.perf_counter() - started, host=host, origin=origin)
+    UPSTREAM_RESPONSES.inc(host=host, status=response.status_code)
+
+
+@contextmanager
+def timeout_limit(seconds):
+    """Cap the connect and read timeouts of every get() this thread makes inside the block."""
+    previous = getattr(_local, "timeout_limit", None)
+    _local.timeout_limit = seconds
+    try:
+        yield
+    finally:
+        _local.timeout_limit = previous
+
+
+def current_timeout_limit():
+    """The timeout_limit() in force in this thread, or None; hand it to worker threads that fetch on its behalf."""
+    return getattr(_local, "timeout_limit", None)
+
+
+def get(url, headers=None, timeout=DEFAULT_READ_TIMEOUT, max_age=None, **kwargs):
+    """
+    GET `url` through the shared pooled session.
+    `timeout` is the read timeout in seconds, or a (connect, read) tuple.
+    When the response store is recording, a stored copy of `url` younger
+    than `max_age` seconds is returned without any request.
+    """
+    host = urlsplit(url).hostname or ""
+    started = time.perf_counter()
+    if _store is not None:
+        if _store_mode == "replay":
+            response = _store.load(url) or missing_response(url)
+            _record(host, "store", response, started)
+            return response
+        if max_age is not None:
+            stored = _store.load(url, max_age)
+            if stored is not None:
+                _record(host, "store", stored, started)
+                return stored
+    if not isinstance(timeout, tuple):
+        timeout = (CONNECT_TIMEOUT, timeout)
+    limit = getattr(_local, "timeout_limit", None)
+    if limit is not None:
+        timeout = (min(timeout[0], limit), min(timeout[1], limit))
+    response = session.get(url, headers=headers, timeout=timeout, **kwargs)
+    _record(host, "network", response, started)
+    UPSTREAM_RESPONSE_BYTES.inc(len(response.content), host=host)
+    if _store is not None and response.status_code == 200:
+        try:
+            _store.save(url, response)
+        except OSError as e:
+            logger.error(f"Failed to store response for {url}: {str(e)}")
+    return response
@@ -1,8 +1,12 @@
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import datetime, timedelta, time
 import json
 import logging
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
+from db_pool import get_db
+from write_behind import queue_write, queue_writes
+from recurrence import expand, is_occurrence, parse_occurrence, format_occurrence
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -10,54 +14,151 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 medicine_bp = Blueprint('medicine', __name__, url_prefix='/medicine')
 
-def get_db():
-    """Import this function from app.py when integrating with main app"""
-    from app import get_db
-    return get_db()
+# Dose occurrences are generated from medicine_doses on demand (see
+# recurrence.py); the notifications table only keeps the occurrences the
+# user acted on (taken, skipped) or that were already sent. Occurrences due
+# within DUE_WINDOW before now and not acted on are reported as pending.
+DUE_WINDOW = timedelta(hours=24)
+
+_ready_databases = set()
+
+def ensure_routine_schema(db, database):
+    """Update databases created before occurrences were virtual, once per database file."""
+    if database in _ready_databases:
+        return
+    columns = {row['name'] for row in db.execute("PRAGMA table_info(medicine_doses)")}
+    if 'active_from' not in columns:
+        db.execute("ALTER TABLE medicine_doses ADD COLUMN active_from TEXT")
+        # Pending rows were pre-generated occurrences; they are expanded on demand now
+        db.execute("DELETE FROM notifications WHERE status = 'pending'")
+    if 'active_until' not in columns:
+        db.execute("ALTER TABLE medicine_doses ADD COLUMN active_until TEXT")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_occurrence ON notifications(dose_id, scheduled_time)")
+    # The composite index covers every range lookup the single-column ones served
+    db.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user_time "
+               "ON notifications(user_id, scheduled_time, status, dose_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_notifications_routine_id ON notifications(routine_id)")
+    for index in ('idx_notifications_user_id', 'idx_notifications_scheduled_time', 'idx_notifications_status'):
+        db.execute(f"DROP INDEX IF EXISTS {index}")
+    db.commit()
+    _ready_databases.add(database)
+
+@medicine_bp.before_request
+def prepare_schema():
+    ensure_routine_schema(get_db(), current_app.config['DATABASE'])
+
+def load_doses(db, user_id, dose_id=None, since=None):
+    """
+    The user's doses joined with their routine, as expand() takes them.
+    Doses retired by an edit are included while they were active after `since`.
+    """
+    sql = """SELECT d.id AS dose_id, d.routine_id, d.time_of_day, d.frequency_hours, d.active_from,
+                    d.active_until, d.dosage, d.instructions, r.start_date, r.end_date, r.medicine_name,
+                    r.priority
+             FROM medicine_doses d
+             JOIN medicine_routines r ON d.routine_id = r.id
+             WHERE r.user_id = ? AND r.active = 1"""
+    if dose_id is not None:
+        return db.execute(sql + " AND d.id = ?", (user_id, dose_id)).fetchall()
+    if since is not None:
+        return db.execute(sql + " AND (d.active_until IS NULL OR d.active_until > ?)",
+                          (user_id, format_occurrence(since))).fetchall()
+    return db.execute(sql + " AND d.active_until IS NULL", (user_id,)).fetchall()
+
+# Stored occurrences of a user in a time window; a range on scheduled_time
+# (never date(scheduled_time) = ?) so idx_notifications_user_time applies
+OCCURRENCE_STATUS_QUERY = """SELECT dose_id, scheduled_time, status FROM notifications
+                             WHERE user_id = ? AND scheduled_time >= ? AND scheduled_time < ?"""
+
+# Everything the routine index page needs in one pass: each active routine
+# with each of its doses still active in the window, the occurrences stored
+# for the dose in the window, and today's taken/skipped counts
+DASHBOARD_QUERY = """
+SELECT r.*, d.id AS dose_id, d.routine_id, d.time_of_day, d.frequency_hours, d.active_from,
+       d.active_until, d.dosage, d.instructions,
+       group_concat(n.scheduled_time || '|' || n.status) AS acted_on,
+       COUNT(CASE WHEN n.status = 'taken' AND n.scheduled_time >= :today_start THEN 1 END) AS taken_today,
+       COUNT(CASE WHEN n.status = 'skipped' AND n.scheduled_time >= :today_start THEN 1 END) AS skipped_today
+FROM medicine_routines r
+LEFT JOIN medicine_doses d
+       ON d.routine_id = r.id AND (d.active_until IS NULL OR d.active_until > :window_start)
+LEFT JOIN notifications n
+       ON n.dose_id = d.id AND n.scheduled_time >= :window_start AND n.scheduled_time < :window_end
+WHERE r.user_id = :user_id AND r.active = 1
+GROUP BY r.id, d.id
+ORDER BY r.priority DESC, r.medicine_name ASC
+"""
+
+def load_occurrences(db, user_id, window_start, window_end):
+    """Every dose occurrence of the user in [window_start, window_end) with its status."""
+    statuses = {
+        (row['dose_id'], row['scheduled_time']): row['status']
+        for row in db.execute(OCCURRENCE_STATUS_QUERY,
+                              (user_id, format_occurrence(window_start), format_occurrence(window_end)))
+    }
+    return expand(load_doses(db, user_id, since=window_start), window_start, window_end, statuses)
+
+def current_minute():
+    return datetime.now().replace(second=0, microsecond=0)
+
+def today_window():
+    start = datetime.combine(datetime.now().date(), time())
+    return start, start + timedelta(days=1)
+
+def due_pending(occurrences, now):
+    """Occurrences due by `now`, not older than DUE_WINDOW, that nobody acted on."""
+    earliest, latest = format_occurrence(now - DUE_WINDOW), format_occurrence(now)
+    return [occurrence for occurrence in occurrences
+            if occurrence['status'] == 'pending' and earliest <= occurrence['scheduled_time'] <= latest]
 
 @medicine_bp.route('/')
 @login_required
 def index():
     db = get_db()
-    routines = db.execute(
-        """SELECT r.*, 
-              (SELECT COUNT(*) FROM medicine_doses WHERE routine_id = r.id) as dose_count,
-              (SELECT COUNT(*) FROM notifications 
-               WHERE routine_id = r.id AND status = 'pending' 
-               AND scheduled_time <= datetime('now', 'localtime')) as pending_notifications
-           FROM medicine_routines r
-           WHERE r.user_id = ? AND r.active = 1
-           ORDER BY r.priority DESC, r.medicine_name ASC""",
-        (current_user.id,)
-    ).fetchall()
+    now = current_minute()
+    today_start, tomorrow = today_window()
+    window_start = min(today_start, now - DUE_WINDOW)
+    rows = db.execute(DASHBOARD_QUERY, {
+        'user_id': current_user.id,
+        'window_start': format_occurrence(window_start),
+        'window_end': format_occurrence(tomorrow),
+        'today_start': format_occurrence(today_start)
+    }).fetchall()
     
-    today = datetime.now().strftime('%Y-%m-%d')
-    upcoming = db.execute(
-        """SELECT n.id, n.scheduled_time, n.status, r.medicine_name, r.priority, 
-                  d.dosage, d.instructions, d.time_of_day
-           FROM notifications n
-           JOIN medicine_routines r ON n.routine_id = r.id
-           JOIN medicine_doses d ON n.dose_id = d.id
-           WHERE n.user_id = ? AND date(n.scheduled_time) = ? 
-             AND n.status = 'pending'
-           ORDER BY n.scheduled_time ASC
-           LIMIT 5""",
-        (current_user.id, today)
-    ).fetchall()
+    # One row per (routine, dose); routines without active doses have dose_id NULL
+    routines = {}
+    doses = []
+    statuses = {}
+    taken_count = skipped_count = 0
+    for row in rows:
+        routine = routines.get(row['id'])
+        if routine is None:
+            # The r.* columns come before dose_id
+            routine = routines[row['id']] = {key: row[key] for key in row.keys()[:row.keys().index('dose_id')]}
+            routine['dose_count'] = 0
+        if row['dose_id'] is None:
+            continue
+        doses.append(row)
+        if row['active_until'] is None:
+            routine['dose_count'] += 1
+        for acted_on in row['acted_on'].split(',') if row['acted_on'] else []:
+            scheduled_time, status = acted_on.split('|')
+            statuses[(row['dose_id'], scheduled_time)] = status
+        taken_count += row['taken_today']
+        skipped_count += row['skipped_today']
+    
+    occurrences = expand(doses, window_start, tomorrow, statuses)
+    due_by_routine = Counter(occurrence['routine_id'] for occurrence in due_pending(occurrences, now))
+    for routine in routines.values():
+        routine['pending_notifications'] = due_by_routine[routine['id']]
+    routines = list(routines.values())
+    
+    today = [occurrence for occurrence in occurrences
+             if occurrence['scheduled_time'] >= format_occurrence(today_start) and occurrence['status'] == 'pending']
+    upcoming = today[:5]
     
     # Dosage stats for today
-    taken_count = db.execute(
-        "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND date(scheduled_time) = ? AND status = 'taken'",
-        (current_user.id, today)
-    ).fetchone()[0]
-    remaining_count = db.execute(
-        "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND date(scheduled_time) = ? AND status = 'pending'",
-        (current_user.id, today)
-    ).fetchone()[0]
-    skipped_count = db.execute(
-        "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND date(scheduled_time) = ? AND status = 'skipped'",
-        (current_user.id, today)
-    ).fetchone()[0]
+    remaining_count = len(today)
     
     return render_template(
         'medicine_routine.html', 
@@ -96,24 +197,20 @@ def add():
             )
             routine_id = cursor.lastrowid
             
-            # Insert doses
+            # Insert doses; their occurrences are generated on demand
+            active_from = format_occurrence(datetime.now())
             for dose in doses:
-                cursor = db.execute(
+                db.execute(
                     """INSERT INTO medicine_doses
-                       (routine_id, time_of_day, frequency_hours, dosage, instructions)
-                       VALUES (?, ?, ?, ?, ?)""",
+                       (routine_id, time_of_day, frequency_hours, dosage, instructions, active_from)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
                     (routine_id,
                      dose['time_of_day'],
                      dose['frequency_hours'],  # changed from dose['frequency']
                      dose['dosage'],
-                     dose.get('instructions', ''))
+                     dose.get('instructions', ''),
+                     active_from)
                 )
-                dose_id = cursor.lastrowid
-                
-                schedule_notifications(db, routine_id, dose_id,
-                                       dose['time_of_day'],
-                                       dose['frequency_hours'],  # changed from dose['frequency']
-                                       start_date, end_date)
             # Commit transaction
             db.commit()
             
@@ -127,6 +224,55 @@ def add():
     
     return render_template('add_medicine.html')
 
+def diff_doses(current, submitted):
+    """
+    Compare a routine's active doses (rows by id) with the doses submitted by
+    the edit form. Returns (added, text_changes, retired): doses to insert,
+    (dosage, instructions, id) updates for doses whose schedule is unchanged,
+    and ids of doses that were removed or rescheduled.
+    """
+    added, text_changes, retired = [], [], []
+    kept = set()
+    for dose in submitted:
+        old = current.get(dose.get('id'))
+        if old is None or old['id'] in kept:
+            added.append(dose)
+            continue
+        kept.add(old['id'])
+        if (old['time_of_day'], int(old['frequency_hours'])) != (dose['time_of_day'], int(dose['frequency_hours'])):
+            # A new schedule is a new dose; the old one keeps its past occurrences
+            retired.append(old['id'])
+            added.append(dose)
+        elif (old['dosage'], old['instructions'] or '') != (dose['dosage'], dose.get('instructions', '')):
+            text_changes.append((dose['dosage'], dose.get('instructions', ''), old['id']))
+    retired.extend(dose_id for dose_id in current if dose_id not in kept)
+    return added, text_changes, retired
+
+def apply_dose_changes(db, routine_id, submitted):
+    """Write the difference between the routine's doses and `submitted`, inside the caller's transaction."""
+    current = {row['id']: row for row in db.execute(
+        "SELECT * FROM medicine_doses WHERE routine_id = ? AND active_until IS NULL", (routine_id,))}
+    added, text_changes, retired = diff_doses(current, submitted)
+    now = format_occurrence(datetime.now())
+    if retired:
+        db.executemany("UPDATE medicine_doses SET active_until = ? WHERE id = ?",
+                       [(now, dose_id) for dose_id in retired])
+        # Occurrences of retired doses from now on no longer exist
+        db.executemany("DELETE FROM notifications WHERE dose_id = ? AND scheduled_time >= ?",
+                       [(dose_id, now) for dose_id in retired])
+    if text_changes:
+        db.executemany("UPDATE medicine_doses SET dosage = ?, instructions = ? WHERE id = ?", text_changes)
+    if added:
+        db.executemany(
+            """INSERT INTO medicine_doses
+               (routine_id, time_of_day, frequency_hours, dosage, instructions, active_from)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(routine_id, dose['time_of_day'], dose['frequency_hours'], dose['dosage'],
+              dose.get('instructions', ''), now) for dose in added]
+        )
+    logger.info(f"Routine {routine_id} edit: {len(added)} doses added, {len(text_changes)} updated, "
+                f"{len(retired)} retired")
+
 @medicine_bp.route('/edit/<int:routine_id>', methods=['GET', 'POST'])
 @login_required
 def edit(routine_id):
@@ -167,28 +313,8 @@ def edit(routine_id):
                  start_date, end_date if end_date else None, routine_id)
             )
             
-            # Delete existing doses and notifications
-            db.execute("DELETE FROM medicine_doses WHERE routine_id = ?", (routine_id,))
-            db.execute("DELETE FROM notifications WHERE routine_id = ?", (routine_id,))
-            
-            # Insert new doses and generate notifications
-            for dose in doses:
-                cursor = db.execute(
-                    """INSERT INTO medicine_doses
-                       (routine_id, time_of_day, frequency_hours, dosage, instructions)
-                       VALUES (?, ?, ?, ?, ?)""",
-                    (routine_id,
-                     dose['time_of_day'],
-                     dose['frequency_hours'],  # fixed key name here
-                     dose['dosage'],
-                     dose.get('instructions', ''))
-                )
-                dose_id = cursor.lastrowid
-                
-                schedule_notifications(db, routine_id, dose_id,
-                                       dose['time_of_day'],
-                                       dose['frequency_hours'],  # fixed key name here
-                                       start_date, end_date)
+            # Apply only the dose changes; the taken/skipped history is kept
+            apply_dose_changes(db, routine_id, doses)
             
             # Commit transaction
             db.commit()
@@ -203,7 +329,7 @@ def edit(routine_id):
     
     # Get doses for this routine
     doses = db.execute(
-        "SELECT * FROM medicine_doses WHERE routine_id = ?",
+        "SELECT * FROM medicine_doses WHERE routine_id = ? AND active_until IS NULL",
         (routine_id,)
     ).fetchall()
     
@@ -245,73 +371,78 @@ def delete(routine_id):
     
     return redirect(url_for('medicine.index'))
 
-@medicine_bp.route('/notification/update/<int:notification_id>', methods=['POST'])
+@medicine_bp.route('/doses/<int:dose_id>/occurrence', methods=['POST'])
 @login_required
-def update_notification(notification_id):
-    """Update notification status (taken or skipped)"""
+def update_occurrence(dose_id):
+    """Record that one occurrence of a dose was taken or skipped"""
     data = request.get_json() or {}
     status = data.get('status', 'taken')
+    if status not in ('taken', 'skipped'):
+        return jsonify({'success': False, 'message': 'Invalid status'})
     
     db = get_db()
     
-    # Check if notification belongs to user
-    notification = db.execute(
-        "SELECT * FROM notifications WHERE id = ? AND user_id = ?",
-        (notification_id, current_user.id)
-    ).fetchone()
-    
-    if not notification:
-        return jsonify({'success': False, 'message': 'Notification not found'})
+    # Check the dose belongs to the user and is due at that time
+    doses = load_doses(db, current_user.id, dose_id)
+    try:
+        scheduled_time = parse_occurrence(data.get('scheduled_time', ''))
+    except (TypeError, ValueError):
+        scheduled_time = None
+    if not doses or scheduled_time is None or not is_occurrence(doses[0], scheduled_time):
+        return jsonify({'success': False, 'message': 'Dose not found'})
     
     try:
-        db.execute(
-            "UPDATE notifications SET status = ?, updated_at = datetime('now', 'localtime') WHERE id = ?",
-            (status, notification_id)
+        queue_write(
+            """INSERT INTO notifications (user_id, routine_id, dose_id, scheduled_time, status, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (dose_id, scheduled_time) DO UPDATE
+               SET status = excluded.status, updated_at = excluded.updated_at""",
+            (current_user.id, doses[0]['routine_id'], dose_id, format_occurrence(scheduled_time), status,
+             datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         )
-        db.commit()
         return jsonify({'success': True})
     except Exception as e:
-        logger.error(f"Failed to update notification: {str(e)}")
+        logger.error(f"Failed to update dose occurrence: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
+
+def occurrence_json(occurrence, with_status=False):
+    result = {
+        'dose_id': occurrence['dose_id'],
+        'time': occurrence['scheduled_time'],
+        'medicine': occurrence['medicine_name'],
+        'dosage': occurrence['dosage'],
+        'instructions': occurrence['instructions'],
+        'priority': occurrence['priority']
+    }
+    if with_status:
+        result['status'] = occurrence['status']
+    return result
+
 @medicine_bp.route('/notifications/pending')
 @login_required
 def pending_notifications():
     """Get pending notifications for the user (used for AJAX polling)"""
     db = get_db()
     
-    # Get current pending notifications
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
-    notifications = db.execute(
-        """SELECT n.id, n.scheduled_time, r.medicine_name, r.priority,
-                  d.dosage, d.instructions
-           FROM notifications n
-           JOIN medicine_routines r ON n.routine_id = r.id
-           JOIN medicine_doses d ON n.dose_id = d.id
-           WHERE n.user_id = ? AND n.status = 'pending'
-             AND datetime(n.scheduled_time) <= datetime(?, 'localtime')
-           ORDER BY n.scheduled_time ASC""",
-        (current_user.id, current_time)
-    ).fetchall()
+    # Due occurrences nobody acted on yet
+    now = current_minute()
+    due = due_pending(load_occurrences(db, current_user.id, now - DUE_WINDOW, now + timedelta(minutes=1)), now)
     
-    result = []
-    for note in notifications:
-        # Update status to "sent"
-        db.execute(
-            "UPDATE notifications SET status = 'sent', sent_at = datetime('now', 'localtime') WHERE id = ? AND status = 'pending'",
-            (note['id'],)
-        )
-        
-        result.append({
-            'id': note['id'],
-            'time': note['scheduled_time'],
-            'medicine': note['medicine_name'],
-            'dosage': note['dosage'],
-            'instructions': note['instructions'],
-            'priority': note['priority']
-        })
-    
-    db.commit()
-    return jsonify(result)
+    # Marked as sent by the write-behind queue, in one batch
+    if due:
+        sent_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            queue_writes(
+                """INSERT INTO notifications (user_id, routine_id, dose_id, scheduled_time, status, sent_at)
+                   VALUES (?, ?, ?, ?, 'sent', ?)
+                   ON CONFLICT (dose_id, scheduled_time) DO NOTHING""",
+                [(current_user.id, occurrence['routine_id'], occurrence['dose_id'], occurrence['scheduled_time'],
+                  sent_at)
+                 for occurrence in due]
+            )
+        except Exception as e:
+            logger.error(f"Failed to queue sent notifications: {str(e)}")
+    return jsonify([occurrence_json(occurrence) for occurrence in due])
 
 @medicine_bp.route('/notifications/today')
 @login_required
@@ -319,65 +450,6 @@ def today_notifications():
     """Get all of today's notifications for the user"""
     db = get_db()
     
-    today = datetime.now().strftime('%Y-%m-%d')
-    notifications = db.execute(
-        """SELECT n.id, n.scheduled_time, n.status, r.medicine_name, r.priority,
-                  d.dosage, d.instructions
-           FROM notifications n
-           JOIN medicine_routines r ON n.routine_id = r.id
-           JOIN medicine_doses d ON n.dose_id = d.id
-           WHERE n.user_id = ? AND date(n.scheduled_time) = ?
-           ORDER BY n.scheduled_time ASC""",
-        (current_user.id, today)
-    ).fetchall()
-    
-    result = []
-    for note in notifications:
-        result.append({
-            'id': note['id'],
-            'time': note['scheduled_time'],
-            'status': note['status'],
-            'medicine': note['medicine_name'],
-            'dosage': note['dosage'],
-            'instructions': note['instructions'],
-            'priority': note['priority']
-        })
-    
-    return jsonify(result)
-
-def schedule_notifications(db, routine_id, dose_id, time_of_day, frequency_hours, start_date, end_date=None):
-    """Schedule notifications for a medicine dose"""
-    # Convert to datetime objects
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    
-    # If end_date is not specified, schedule for 30 days
-    if end_date:
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-    else:
-        end = start + timedelta(days=30)
-    
-    # Parse time of day
-    hour, minute = map(int, time_of_day.split(':'))
-    
-    # Generate notification times
-    current_date = start
-    while current_date <= end:
-        # Start with the first dose at the specified time
-        current_time = datetime.combine(current_date.date(), datetime.strptime(time_of_day, '%H:%M').time())
-        
-        # Schedule doses throughout the day based on frequency
-        while current_time.date() == current_date.date():
-            if current_time >= datetime.now():
-                # Only schedule future notifications
-                db.execute(
-                    """INSERT INTO notifications
-                       (user_id, routine_id, dose_id, scheduled_time, status)
-                       VALUES (?, ?, ?, ?, 'pending')""",
-                    (current_user.id, routine_id, dose_id, current_time.strftime('%Y-%m-%d %H:%M'))
-                )
-            
-            # Next dose after frequency_hours
-            current_time += timedelta(hours=int(frequency_hours))
-        
-        # Move to next day
-        current_date += timedelta(days=1)
\ No newline at end of file
+    today_start, tomorrow = today_window()
+    occurrences = load_occurrences(db, current_user.id, today_start, tomorrow)
+    return jsonify([occurrence_json(occurrence, with_status=True) for occurrence in occurrences])
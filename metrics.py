@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter, one series per label combination."""
+
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _label_text(self.labels, key), value
+
+
+class Histogram:
+    """Thread-safe histogram with fixed buckets, one series per label combination."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the block, including when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield (self.name + "_bucket", _label_text(self.labels + ("le",), key + (_format_number(bound),)),
+                       cumulative)
+            yield self.name + "_sum", _label_text(self.labels, key), round(total, 6)
+            yield self.name + "_count", _label_text(self.labels, key), count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UPSTREAM_FETCH_SECONDS = registry.register(Histogram(
+    "upstream_fetch_seconds", "Time to fetch an upstream page, by host and origin (network or store).",
+    ("host", "origin")))
+UPSTREAM_RESPONSE_BYTES = registry.register(Counter(
+    "upstream_response_bytes_total", "Bytes of upstream response bodies downloaded, by host.", ("host",)))
+UPSTREAM_RESPONSES = registry.register(Counter(
+    "upstream_responses_total", "Upstream responses, by host and status code.", ("host", "status")))
+PARSE_SECONDS = registry.register(Histogram(
+    "parse_seconds", "Time spent building a DOM or decoding embedded JSON, by page type.", ("page",)))
+SOURCE_SCRAPE_SECONDS = registry.register(Histogram(
+    "source_scrape_seconds", "Wall time of one scraper run, by source.", ("source",)))
+SCRAPER_STRATEGY = registry.register(Counter(
+    "scraper_strategy_total", "Scraper runs by the extraction strategy that produced results (none if all failed).",
+    ("source", "strategy")))
+SEARCH_CACHE_LOOKUPS = registry.register(Counter(
+    "search_cache_lookups_total",
+    "Per-source result lookups by outcome: fresh, stale, precomputed, joined (in-flight scrape) or miss.",
+    ("source", "result")))
+SEARCH_SECONDS = registry.register(Histogram(
+    "search_seconds", "Wall time of a whole multi-source search.", ()))
+REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_seconds", "Time to produce a response, by endpoint and status code.", ("endpoint", "status")))
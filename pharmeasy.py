@@ -1,12 +1,171 @@
-import requests
-from bs4 import BeautifulSoup
+import http_client
+from metrics import SCRAPER_STRATEGY
+from source_health import report_empty_page
+from html_parsing import make_soup, decode_object_after, compile_spec, extract
+from price_parsing import parse_price, format_price, find_price_text, first_number, first_int
 import random
 import re
-import json
 import logging
+import soupsieve
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from product_pages import product_cache, PRODUCT_PAGE_MAX_AGE
+
+INITIAL_STATE_RE = re.compile(rb'window\.__INITIAL_STATE__\s*=\s*(?=\{)')
+
+# Product pages fetched at once per search by the last-resort path
+DEEP_FETCH_WORKERS = 4
+DEEP_FETCH_LIMIT = 10
+DEEP_FETCH_ENOUGH = 5
+
+# Candidates returned per search; ranking and paging happen after the fan-out
+MAX_CANDIDATES = 10
+
+RATING_SELECTOR = "div[class*='rating'], span[class*='rating'], div[class*='Rating'], span[class*='Rating']"
+REVIEW_SELECTOR = "div[class*='review'], span[class*='review'], div[class*='Review'], span[class*='Review']"
+
+
+def _first_titled_text(card):
+    # Any heading or paragraph with text, when no title class matched
+    title_elem = card.find(lambda tag: tag.name in ['h1', 'h2', 'h3', 'p'] and tag.get_text(strip=True))
+    return title_elem.get_text(strip=True) if title_elem else None
+
+
+# Search result cards: the specific card classes first, then anything card-like
+CARD_PATTERNS = [
+    soupsieve.compile("[data-test='product-card'], .ProductCard_productCard__OXwT6, .ProductCard_medicineCard__8kZBB, .ProductCard_productCardWrapper__Emr18, div[class*='ProductCard_']"),
+    soupsieve.compile("div[class*='card'], div[class*='Card'], div[data-test*='product']")
+]
+CARD_SPEC = compile_spec({
+    "title": {"select": ["h2, h3, div[class*='name'], div[class*='title'], div[class*='Name'], div[class*='Title']"],
+              "fallback": _first_titled_text, "default": "Unknown Product"},
+    "price": {"select": ["div[class*='Price'], span[class*='Price'], div[class*='price'], span[class*='price'], div[class*='MRP'], span[class*='MRP'], div[class*='_sale'], span[class*='_sale'], div[class*='final'], span[class*='final']"]},
+    "ratings": {"select": [RATING_SELECTOR], "post": first_number, "default": 0},
+    "reviews": {"select": [REVIEW_SELECTOR], "post": first_int, "default": 0},
+    "link": {"select": ["a"], "get": ["href"]}
+})
+PRICE_ATTRIBUTES = ['data-price', 'data-mrp', 'data-saleprice', 'data-value']
+PRICE_ATTRIBUTE_PATTERN = soupsieve.compile("[data-price], [data-mrp], [data-saleprice], [data-value]")
+PRODUCT_LINK_PATTERN = soupsieve.compile("a")
+
+# Product page fields read by the last-resort deep fetch
+DEEP_FETCH_SPEC = compile_spec({
+    "price": {"select": ["div[class*='Price'], span[class*='Price'], div[class*='price'], span[class*='price'], div[class*='MRP'], span[class*='MRP']"]},
+    "ratings": {"select": [RATING_SELECTOR], "post": first_number, "default": 0},
+    "reviews": {"select": [REVIEW_SELECTOR], "post": first_int, "default": 0}
+})
+
+
+def _deep_fetch_product(product, user_agents, logger, timeout_limit=None):
+    """Fetch one product page and score it by price, ratings and reviews."""
+    price_found = False
+    price = "MRP₹--*"
+    popularity_score = 0
+    
+    # A product page viewed recently already has its price extracted
+    cached, _ = product_cache.get(("PharmEasy", product["link"]))
+    if cached and cached["record"]["price"] != "Price not available":
+        price = cached["record"]["price"]
+        return {
+            "source": "PharmEasy",
+            "title": product["title"],
+            "link": product["link"],
+            "price": price,
+            "raw_price": parse_price(price)["sale_price"] or 0,
+            "popularity": 0
+        }
+    
+    # Scrape the product page directly for price
+    try:
+        # Runs on the deep-fetch pool, so the searching thread's limit is passed in
+        with http_client.timeout_limit(timeout_limit):
+            product_response = http_client.get(
+                product["link"], 
+                headers={"User-Agent": random.choice(user_agents)},
+                timeout=5,
+                max_age=PRODUCT_PAGE_MAX_AGE
+            )
+        
+        if product_response.status_code == 200:
+            product_soup = make_soup(product_response.text)
+            # Flatten the page text once; every lookup below reuses it
+            page_text = product_soup.get_text()
+            fields = extract(product_soup, DEEP_FETCH_SPEC)
+            
+            # Look for price on product page
+            if fields["price"] is not None:
+                price = fields["price"]
+                price_found = True
+            
+            if not price_found:
+                # Look for rupee symbol
+                rupee_text = find_price_text(page_text)
+                if rupee_text:
+                    price = rupee_text
+                    price_found = True
+            
+            # Try to extract structured price info
+            prices = parse_price(price, page_text)
+            if find_price_text(price) and prices["mrp"]:
+                price = format_price(prices["sale_price"], prices["mrp"], prices["discount"])
+            
+            # Score by ratings and reviews
+            popularity_score = fields["ratings"] * 2 + fields["reviews"]
+    except Exception as e:
+        logger.error(f"Error fetching product page: {str(e)}")
+        popularity_score = 0
+    
+    # Extract raw price for sorting
+    raw_price = parse_price(price)["sale_price"] or 0
+    
+    return {
+        "source": "PharmEasy",
+        "title": product["title"],
+        "link": product["link"],
+        "price": price,
+        "raw_price": raw_price,
+        "popularity": popularity_score
+    }
+
+
+def _deep_fetch_products(products, user_agents, logger):
+    """
+    Fetch product pages with bounded concurrency, skipping duplicate links,
+    and stop as soon as DEEP_FETCH_ENOUGH priced products are found.
+    """
+    unique_products = []
+    seen_links = set()
+    for product in products:
+        if product["link"] in seen_links:
+            continue
+        seen_links.add(product["link"])
+        unique_products.append(product)
+        if len(unique_products) == DEEP_FETCH_LIMIT:
+            break
+    
+    scored_products = []
+    priced = 0
+    limit = http_client.current_timeout_limit()
+    executor = ThreadPoolExecutor(max_workers=DEEP_FETCH_WORKERS, thread_name_prefix="pharmeasy-deep-fetch")
+    try:
+        futures = [executor.submit(_deep_fetch_product, product, user_agents, logger, limit) for product in unique_products]
+        for future in as_completed(futures):
+            scored = future.result()
+            scored_products.append(scored)
+            if scored["price"] != "MRP₹--*":
+                priced += 1
+                if priced >= DEEP_FETCH_ENOUGH:
+                    break
+    finally:
+        # Drop queued fetches; any still in flight finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+    return scored_products
+
 
 def search_pharmeasy(encoded_query, query, user_agents, logger):
     pharmeasy_results = []
+    strategy = None
+    # The page came back and parsed; if it listed nothing, the medicine just is not stocked
+    answered = False
     try:
         # PharmEasy frequently changes their API/HTML structure, so we'll try multiple approaches
         
@@ -18,7 +177,7 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
             "Referer": f"https://pharmeasy.in/search/all?name={encoded_query}"
         }
         
-        response = requests.get(api_url, headers=headers, timeout=10)
+        response = http_client.get(api_url, headers=headers, timeout=10)
         if response.status_code == 200:
             try:
                 data = response.json()
@@ -37,11 +196,7 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                             popularity = product.get("popularity", 0) or 0
                             
                             link = f"https://pharmeasy.in/online-medicine-order/{slug}"
-                            price = f"₹{sale_price}"
-                            if discount > 0:
-                                price = f"₹{sale_price}*MRP₹{mrp}Save {discount}%"
-                            else:
-                                price = f"MRP₹{mrp}*"
+                            price = format_price(sale_price, mrp, discount) if discount > 0 else f"MRP₹{mrp}*"
                             
                             all_products.append({
                                 "source": "PharmEasy",
@@ -58,15 +213,10 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                     # Sort by popularity and ratings to get most bought/reviewed products
                     all_products.sort(key=lambda x: (x.get("popularity", 0) + x.get("ratings", 0)), reverse=True)
                     
-                    # Take the top 5 most popular products
-                    pharmeasy_results = all_products[:5]
-                    
-                    # Strip out the metrics we added for sorting
-                    for product in pharmeasy_results:
-                        if "ratings" in product:
-                            del product["ratings"]
-                        if "popularity" in product:
-                            del product["popularity"]
+                    # Keep the scores for the ranking stage
+                    pharmeasy_results = all_products[:MAX_CANDIDATES]
+                    strategy = "api"
+                    answered = True
                     
             except ValueError:
                 logger.warning("Failed to parse PharmEasy API response as JSON")
@@ -82,18 +232,15 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                 "Cache-Control": "no-cache"
             }
             
-            response = requests.get(search_url, headers=headers, timeout=10)
+            response = http_client.get(search_url, headers=headers, timeout=10)
             if response.status_code == 200:
-                # Look for JavaScript data in the page that might contain product information
-                html_content = response.text
-                
-                # Extract product data from any embedded JavaScript
-                json_data_matches = re.findall(r'window\.__INITIAL_STATE__\s*=\s*({.*?});', html_content)
-                if json_data_matches:
+                # Look for JavaScript data in the page that might contain product information.
+                # It is decoded straight from the raw bytes; a DOM is only built if this fails.
+                json_data = decode_object_after(response.content, INITIAL_STATE_RE)
+                if json_data:
                     try:
-                        json_data = json.loads(json_data_matches[0])
                         # Extract product data from the state
-                        if 'search' in json_data and 'products' in json_data['search']:
+                        if isinstance(json_data, dict) and 'search' in json_data and 'products' in json_data['search']:
                             products = json_data['search']['products']
                             all_products = []
                             
@@ -108,11 +255,7 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                                     popularity = product.get("popularity", 0) or 0
                                     
                                     link = f"https://pharmeasy.in/online-medicine-order/{slug}"
-                                    price = f"₹{sale_price}"
-                                    if discount > 0:
-                                        price = f"₹{sale_price}*MRP₹{mrp}Save {discount}%"
-                                    else:
-                                        price = f"MRP₹{mrp}*"
+                                    price = format_price(sale_price, mrp, discount) if discount > 0 else f"MRP₹{mrp}*"
                                         
                                     raw_price = float(sale_price) if sale_price else float(mrp) if mrp else 0
                                     
@@ -132,58 +275,48 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                             # Sort by popularity and ratings to get most bought/reviewed products
                             all_products.sort(key=lambda x: (x.get("popularity", 0) + x.get("ratings", 0)), reverse=True)
                             
-                            # Take the top 5 most popular products
-                            pharmeasy_results = all_products[:5]
-                            
-                            # Strip out the metrics we added for sorting
-                            for product in pharmeasy_results:
-                                if "ratings" in product:
-                                    del product["ratings"]
-                                if "popularity" in product:
-                                    del product["popularity"]
+                            # Keep the scores for the ranking stage
+                            pharmeasy_results = all_products[:MAX_CANDIDATES]
+                            strategy = "embedded_json"
                     except Exception as e:
                         logger.error(f"Error parsing embedded JSON: {str(e)}")
                 
                 # If no results from embedded JSON, try traditional scraping
                 if not pharmeasy_results:
-                    soup = BeautifulSoup(response.text, "html.parser")
-                    
-                    # Try to find the updated CSS selectors
-                    product_cards = soup.select("[data-test='product-card'], .ProductCard_productCard__OXwT6, .ProductCard_medicineCard__8kZBB, .ProductCard_productCardWrapper__Emr18, div[class*='ProductCard_']")
+                    soup = make_soup(response.text, "pharmeasy_search")
                     
-                    # If still no results, try more general approach
-                    if not product_cards:
-                        product_cards = soup.select("div[class*='card'], div[class*='Card'], div[data-test*='product']")
+                    # Try the current card classes first, then a more general approach
+                    product_cards = []
+                    for pattern in CARD_PATTERNS:
+                        product_cards = pattern.select(soup)
+                        if product_cards:
+                            break
                     
                     # Process found cards with advanced price detection
                     all_products = []
                     for card in product_cards:
                         try:
-                            # Try multiple approaches to find the title
-                            title_elem = card.select_one("h2, h3, div[class*='name'], div[class*='title'], div[class*='Name'], div[class*='Title']")
-                            if not title_elem:
-                                title_elem = card.find(lambda tag: tag.name in ['h1', 'h2', 'h3', 'p'] and tag.get_text(strip=True))
-                            
-                            title = title_elem.get_text(strip=True) if title_elem else "Unknown Product"
+                            # One pass of the compiled card spec collects every field
+                            fields = extract(card, CARD_SPEC)
+                            title = fields["title"]
+                            # Flatten the card's text once; the price lookups below all reuse it
+                            card_text = card.get_text()
                             
                             # Multiple approaches to find price
                             price = "Price not available"
                             
                             # Method 1: Look for specific price classes
-                            price_elem = card.select_one("div[class*='Price'], span[class*='Price'], div[class*='price'], span[class*='price'], div[class*='MRP'], span[class*='MRP'], div[class*='_sale'], span[class*='_sale'], div[class*='final'], span[class*='final']")
-                            if price_elem:
-                                price = price_elem.get_text(strip=True)
+                            if fields["price"] is not None:
+                                price = fields["price"]
                             
                             # Method 2: Search for rupee symbol (₹)
                             if price == "Price not available":
-                                rupee_elems = card.find_all(string=lambda s: s and "₹" in s)
-                                if rupee_elems:
-                                    price = rupee_elems[0].strip()
+                                price = find_price_text(card_text) or price
                             
                             # Method 3: Check for HTML attributes that might contain price
                             if price == "Price not available":
-                                for elem in card.select("[data-price], [data-mrp], [data-saleprice], [data-value]"):
-                                    for attr in ['data-price', 'data-mrp', 'data-saleprice', 'data-value']:
+                                for elem in PRICE_ATTRIBUTE_PATTERN.select(card):
+                                    for attr in PRICE_ATTRIBUTES:
                                         if attr in elem.attrs:
                                             try:
                                                 price_val = float(elem[attr])
@@ -192,50 +325,15 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                                             except:
                                                 pass
                             
-                            # Try to find ratings/reviews
-                            ratings = 0
-                            rating_elem = card.select_one("div[class*='rating'], span[class*='rating'], div[class*='Rating'], span[class*='Rating']")
-                            if rating_elem:
-                                rating_text = rating_elem.get_text(strip=True)
-                                rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-                                if rating_match:
-                                    try:
-                                        ratings = float(rating_match.group(1))
-                                    except ValueError:
-                                        ratings = 0
-                            
-                            # Check for review count
-                            reviews = 0
-                            review_elem = card.select_one("div[class*='review'], span[class*='review'], div[class*='Review'], span[class*='Review']")
-                            if review_elem:
-                                review_text = review_elem.get_text(strip=True)
-                                review_match = re.search(r'(\d+)', review_text)
-                                if review_match:
-                                    try:
-                                        reviews = int(review_match.group(1))
-                                    except ValueError:
-                                        reviews = 0
-                            
                             # Format price like the examples if we have MRP and discount info
-                            mrp_match = re.search(r'MRP:?\s*₹?(\d+\.?\d*)', price) or re.search(r'MRP:?\s*₹?(\d+\.?\d*)', card.get_text())
-                            price_match = re.search(r'₹(\d+\.?\d*)', price)
-                            discount_match = re.search(r'(\d+)%\s*off', price) or re.search(r'(\d+)%\s*off', card.get_text())
-                            
-                            if price_match and mrp_match:
-                                sale_price = float(price_match.group(1))
-                                mrp = float(mrp_match.group(1))
-                                discount = int(discount_match.group(1)) if discount_match else round((1 - sale_price/mrp) * 100)
-                                
-                                if discount > 0:
-                                    price = f"₹{sale_price}*MRP₹{mrp}Save {discount}%"
-                                else:
-                                    price = f"MRP₹{mrp}*"
+                            prices = parse_price(price, card_text)
+                            if find_price_text(price) and prices["mrp"]:
+                                price = format_price(prices["sale_price"], prices["mrp"], prices["discount"])
                             
                             # Try to find link
                             link = "#"
-                            link_elem = card.select_one("a")
-                            if link_elem and link_elem.has_attr("href"):
-                                link = link_elem["href"]
+                            if fields["link"] is not None:
+                                link = fields["link"]
                                 if link.startswith("/"):
                                     link = f"https://pharmeasy.in{link}"
                             else:
@@ -256,29 +354,20 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                             # Parse raw price for sorting
                             raw_price = 0
                             if price != "Price not available":
-                                # Extract digits and decimal from price string
-                                price_text = re.search(r'₹(\d+\.?\d*)', price)
-                                if price_text:
-                                    try:
-                                        raw_price = float(price_text.group(1))
-                                    except ValueError:
-                                        raw_price = 0
+                                raw_price = parse_price(price)["sale_price"] or 0
                             
                             # If price still not found, use alternate approach to estimate price
                             if price == "Price not available":
                                 # Try to find the price from title or other elements if it includes price info
-                                title_price = re.search(r'(?:Rs\.?|₹|INR)\s*(\d+\.?\d*)', title)
-                                if title_price:
-                                    price = f"₹{title_price.group(1)}"
-                                    try:
-                                        raw_price = float(title_price.group(1))
-                                    except ValueError:
-                                        raw_price = 0
+                                title_price = parse_price(title)["sale_price"]
+                                if title_price is not None:
+                                    price = f"₹{title_price:g}"
+                                    raw_price = title_price
                                 else:
                                     # Use a default price as a last resort
                                     price = "MRP₹--*"
                             
-                            popularity_score = ratings * 2 + reviews  # Give more weight to ratings
+                            popularity_score = fields["ratings"] * 2 + fields["reviews"]  # Give more weight to ratings
                             
                             all_products.append({
                                 "source": "PharmEasy",
@@ -295,20 +384,16 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                     # Sort by popularity score
                     all_products.sort(key=lambda x: x.get("popularity", 0), reverse=True)
                     
-                    # Take top 5 products
-                    pharmeasy_results = all_products[:5]
-                    
-                    # Remove sorting fields
-                    for product in pharmeasy_results:
-                        if "popularity" in product:
-                            del product["popularity"]
+                    # Keep the scores for the ranking stage
+                    pharmeasy_results = all_products[:MAX_CANDIDATES]
+                    strategy = "cards"
                     
                     # If still no results, try even more general scraping as last resort
                     if not pharmeasy_results:
                         all_products = []
                         
                         # Find all links that look like product links
-                        for link in soup.select("a"):
+                        for link in PRODUCT_LINK_PATTERN.select(soup):
                             href = link.get("href", "")
                             if "/online-medicine-order/" in href or "product-details" in href:
                                 product_text = link.get_text(strip=True)
@@ -318,114 +403,24 @@ def search_pharmeasy(encoded_query, query, user_agents, logger):
                                         "link": href if href.startswith("http") else f"https://pharmeasy.in{href}"
                                     })
                         
-                        # Try to find prices near each product
-                        scored_products = []
-                        for product in all_products[:10]:  # Process more to find best ones
-                            price_found = False
-                            price = "MRP₹--*"
-                            
-                            # Scrape the product page directly for price
-                            try:
-                                product_response = requests.get(
-                                    product["link"], 
-                                    headers={"User-Agent": random.choice(user_agents)},
-                                    timeout=5
-                                )
-                                
-                                if product_response.status_code == 200:
-                                    product_soup = BeautifulSoup(product_response.text, 'html.parser')
-                                    
-                                    # Look for price on product page
-                                    price_elem = product_soup.select_one("div[class*='Price'], span[class*='Price'], div[class*='price'], span[class*='price'], div[class*='MRP'], span[class*='MRP']")
-                                    if price_elem:
-                                        price = price_elem.get_text(strip=True)
-                                        price_found = True
-                                    
-                                    if not price_found:
-                                        # Look for rupee symbol
-                                        rupee_elems = product_soup.find_all(string=lambda s: s and "₹" in s)
-                                        if rupee_elems:
-                                            price = rupee_elems[0].strip()
-                                            price_found = True
-                                    
-                                    # Try to extract structured price info
-                                    mrp_match = re.search(r'MRP:?\s*₹?(\d+\.?\d*)', price) or re.search(r'MRP:?\s*₹?(\d+\.?\d*)', product_soup.get_text())
-                                    price_match = re.search(r'₹(\d+\.?\d*)', price)
-                                    discount_match = re.search(r'(\d+)%\s*off', price) or re.search(r'(\d+)%\s*off', product_soup.get_text())
-                                    
-                                    if price_match and mrp_match:
-                                        sale_price = float(price_match.group(1))
-                                        mrp = float(mrp_match.group(1))
-                                        discount = int(discount_match.group(1)) if discount_match else round((1 - sale_price/mrp) * 100)
-                                        
-                                        if discount > 0:
-                                            price = f"₹{sale_price}*MRP₹{mrp}Save {discount}%"
-                                        else:
-                                            price = f"MRP₹{mrp}*"
-                                    
-                                    # Look for ratings and reviews to score products
-                                    ratings = 0
-                                    reviews = 0
-                                    
-                                    # Rating elements
-                                    rating_elem = product_soup.select_one("div[class*='rating'], span[class*='rating'], div[class*='Rating'], span[class*='Rating']")
-                                    if rating_elem:
-                                        rating_text = rating_elem.get_text(strip=True)
-                                        rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-                                        if rating_match:
-                                            try:
-                                                ratings = float(rating_match.group(1))
-                                            except ValueError:
-                                                ratings = 0
-                                    
-                                    # Review count elements
-                                    review_elem = product_soup.select_one("div[class*='review'], span[class*='review'], div[class*='Review'], span[class*='Review']")
-                                    if review_elem:
-                                        review_text = review_elem.get_text(strip=True)
-                                        review_match = re.search(r'(\d+)', review_text)
-                                        if review_match:
-                                            try:
-                                                reviews = int(review_match.group(1))
-                                            except ValueError:
-                                                reviews = 0
-                                    
-                                    # Score by ratings and reviews
-                                    popularity_score = ratings * 2 + reviews
-                            except Exception as e:
-                                logger.error(f"Error fetching product page: {str(e)}")
-                                popularity_score = 0
-                            
-                            # Extract raw price for sorting
-                            raw_price = 0
-                            if price != "MRP₹--*":
-                                price_text = re.search(r'₹(\d+\.?\d*)', price)
-                                if price_text:
-                                    try:
-                                        raw_price = float(price_text.group(1))
-                                    except ValueError:
-                                        raw_price = 0
-                            
-                            scored_products.append({
-                                "source": "PharmEasy",
-                                "title": product["title"],
-                                "link": product["link"],
-                                "price": price,
-                                "raw_price": raw_price,
-                                "popularity": popularity_score
-                            })
+                        # Fetch product pages concurrently to find prices
+                        scored_products = _deep_fetch_products(all_products, user_agents, logger)
                         
                         # Sort by popularity
                         scored_products.sort(key=lambda x: x.get("popularity", 0), reverse=True)
                         
-                        # Take top 5
-                        for product in scored_products[:5]:
-                            if "popularity" in product:
-                                del product["popularity"]
-                            pharmeasy_results.append(product)
+                        pharmeasy_results.extend(scored_products[:MAX_CANDIDATES])
+                        strategy = "deep_fetch"
                 
                 # Limit the results
-                pharmeasy_results = pharmeasy_results[:5]
+                pharmeasy_results = pharmeasy_results[:MAX_CANDIDATES]
+                answered = True
     except Exception as e:
         logger.error(f"PharmEasy search error: {str(e)}")
     
+    if not pharmeasy_results:
+        strategy = "empty" if answered else "none"
+        if answered:
+            report_empty_page()
+    SCRAPER_STRATEGY.inc(source="PharmEasy", strategy=strategy)
     return pharmeasy_results
\ No newline at end of file
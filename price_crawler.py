@@ -0,0 +1,151 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus
+
+from query_normalization import canonical_query
+from catalog import record_results
+from db_pool import get_pool
+from search_fanout import scrape_source
+
+logger = logging.getLogger(__name__)
+
+# How many of the most searched queries to keep warm, and how often
+TOP_QUERIES = 50
+CRAWL_INTERVAL = 30 * 60
+CRAWL_WORKERS = 4
+# Precomputed prices older than this are ignored by /search
+MAX_PRICE_AGE = timedelta(hours=2)
+
+PRICE_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS popular_prices (
+    query_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    results TEXT NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (query_key, source)
+)
+"""
+
+
+_ready_databases = set()
+
+
+def ensure_price_table(db, database):
+    """Create the precomputed prices table once per database file."""
+    if database in _ready_databases:
+        return
+    db.execute(PRICE_TABLE_SCHEMA)
+    db.commit()
+    _ready_databases.add(database)
+
+
+def top_queries(db, limit=TOP_QUERIES):
+    """Return the `limit` most searched queries from search_history as (query, canonical key)."""
+    rows = db.execute(
+        """SELECT lower(trim(query)) AS query, COUNT(*) AS searches
+           FROM search_history
+           GROUP BY lower(trim(query))
+           ORDER BY searches DESC
+           LIMIT ?""",
+        (limit * 2,)
+    ).fetchall()
+    # SQL cannot fold punctuation, units or dosage forms, so merge spellings with the same canonical key here
+    counts = {}
+    originals = {}
+    for row in rows:
+        key = canonical_query(row['query'])
+        if not key:
+            continue
+        counts[key] = counts.get(key, 0) + row['searches']
+        originals.setdefault(key, row['query'])
+    ranked = sorted(counts, key=counts.get, reverse=True)[:limit]
+    return [(originals[key], key) for key in ranked]
+
+
+def lookup_prices(db, database, query):
+    """Return {source: results} of fresh precomputed prices for `query`."""
+    ensure_price_table(db, database)
+    query_key = canonical_query(query)
+    if not query_key:
+        return {}
+    cutoff = (datetime.now() - MAX_PRICE_AGE).strftime('%Y-%m-%d %H:%M:%S')
+    rows = db.execute(
+        "SELECT source, results FROM popular_prices WHERE query_key = ? AND refreshed_at >= ?",
+        (query_key, cutoff)
+    ).fetchall()
+    return {row['source']: json.loads(row['results']) for row in rows}
+
+
+def _crawl_one(source, query, query_key, user_agents):
+    """Scrape one (source, query) pair; returns its results or [] on failure."""
+    health = source.get("health")
+    if health and not health.allow_request():
+        return []
+    try:
+        # Records the outcome on the source's health, so a probe let through
+        # a half-open circuit is always resolved
+        results, _ = scrape_source(source, quote_plus(query), query, user_agents, logger)
+        return results
+    except Exception as e:
+        logger.error(f"Price crawl of {source['name']} for '{query_key}' failed: {str(e)}")
+        return []
+
+
+def crawl_once(database, sources, user_agents, limit=TOP_QUERIES, workers=CRAWL_WORKERS):
+    """Re-scrape the top queries with bounded concurrency and store the results."""
+    connections = get_pool(database)
+    db = connections.acquire()
+    try:
+        ensure_price_table(db, database)
+        queries = top_queries(db, limit)
+        jobs = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-crawler") as pool:
+            for query, query_key in queries:
+                for source in sources:
+                    future = pool.submit(_crawl_one, source, query, query_key, user_agents)
+                    jobs[future] = (query_key, source["name"])
+        stored = 0
+        for future, (query_key, source_name) in jobs.items():
+            results = future.result()
+            # Keep the previous prices rather than overwrite them with a failed scrape
+            if not results:
+                continue
+            db.execute(
+                """INSERT OR REPLACE INTO popular_prices (query_key, source, results, refreshed_at)
+                   VALUES (?, ?, ?, ?)""",
+                (query_key, source_name, json.dumps(results), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            # Crawled items also feed the product catalog
+            record_results(db, database, query_key, source_name, results)
+            stored += 1
+        db.commit()
+        logger.info(f"Price crawl refreshed {stored} of {len(jobs)} source results for {len(queries)} queries")
+        return stored
+    finally:
+        connections.release(db)
+
+
+class PriceCrawler(threading.Thread):
+    """Daemon thread that runs crawl_once every `interval` seconds."""
+
+    def __init__(self, database, sources, user_agents, interval=CRAWL_INTERVAL):
+        super().__init__(name="price-crawler", daemon=True)
+        self.database = database
+        self.sources = sources
+        self.user_agents = user_agents
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                crawl_once(self.database, self.sources, self.user_agents)
+            except Exception as e:
+                logger.error(f"Price crawl failed: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,87 @@
+import re
+
+# Amounts are written "₹45", "₹ 1,299.00", "Rs. 45" or "INR 45"
+AMOUNT = r"(\d[\d,]*(?:\.\d+)?)"
+PRICE_RE = re.compile(r"(?:₹|\bRs\.?|\bINR)\s*" + AMOUNT)
+MRP_RE = re.compile(r"MRP:?\s*(?:₹|\bRs\.?|\bINR)?\s*" + AMOUNT, re.I)
+DISCOUNT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*%\s*off", re.I)
+SAVE_RE = re.compile(r"Save\s*(\d+(?:\.\d+)?)\s*%", re.I)
+RUPEE_RE = re.compile("₹")
+NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def to_number(text):
+    """Parse "1,299.00" as 1299.0; returns None if `text` is not a number."""
+    try:
+        return float(text.replace(",", ""))
+    except (AttributeError, ValueError):
+        return None
+
+
+def first_number(text, default=0):
+    """First number in `text` (ratings, review counts), or `default`."""
+    match = NUMBER_RE.search(text or "")
+    if not match:
+        return default
+    value = to_number(match.group())
+    return default if value is None else value
+
+
+def first_int(text, default=0):
+    return int(first_number(text, default))
+
+
+def parse_price(text, context=None):
+    """
+    Read the prices out of a price string such as "₹45*MRP₹50Save 10%" or
+    "₹45 (MRP: ₹50, 10% off)". `context` is optional surrounding text (the
+    whole card's or page's) searched for an MRP or discount `text` lacks.
+    Returns {"sale_price", "mrp", "discount", "currency"}; missing fields are None.
+    """
+    text = text or ""
+    mrp_match = MRP_RE.search(text) or (MRP_RE.search(context) if context else None)
+    # The sale price is the first amount that is not the MRP itself
+    sale_price = None
+    for match in PRICE_RE.finditer(text):
+        if mrp_match and mrp_match.string is text and mrp_match.start() <= match.start() < mrp_match.end():
+            continue
+        sale_price = to_number(match.group(1))
+        break
+    mrp = to_number(mrp_match.group(1)) if mrp_match else None
+    if sale_price is None:
+        sale_price = mrp
+    discount_match = (DISCOUNT_RE.search(text) or SAVE_RE.search(text)
+                      or (DISCOUNT_RE.search(context) if context else None))
+    discount = to_number(discount_match.group(1)) if discount_match else None
+    return {
+        "sale_price": sale_price,
+        "mrp": mrp,
+        "discount": discount,
+        "currency": "INR" if sale_price is not None else None
+    }
+
+
+def find_price_text(text):
+    """The first "₹45"-style amount in `text`, or None."""
+    match = PRICE_RE.search(text or "")
+    return match.group(0) if match else None
+
+
+def find_price_string(soup):
+    """The first text node containing "₹"; unlike find_all it stops at the first match."""
+    node = soup.find(string=RUPEE_RE)
+    return node.strip() if node else None
+
+
+def format_price(sale_price, mrp=None, discount=None):
+    """
+    The display string used across sources: "₹45*MRP₹50Save 10%" when
+    discounted, "MRP₹50*" when sold at MRP, "₹45" when the MRP is unknown.
+    """
+    if mrp:
+        if discount is None:
+            discount = round((1 - sale_price / mrp) * 100) if sale_price else 0
+        if discount > 0:
+            return f"₹{sale_price}*MRP₹{mrp}Save {discount:g}%"
+        return f"MRP₹{mrp}*"
+    return f"₹{sale_price}"
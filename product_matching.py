@@ -0,0 +1,180 @@
+import re
+
+from query_normalization import tokenize, FORM_WORDS, UNIT_WORDS, RELEASE_WORDS
+
+# "650mg", "0.5 mg", "100ml"
+STRENGTH_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(mg|mcg|g|gm|iu|ml)\b", re.I)
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+# Units in one pack: "Strip Of 15 Tablets", "15 tablets", "10's"
+UNIT_COUNT_RES = [
+    re.compile(r"\b(?:strip|bottle|box|jar)\s+of\s+(\d+)\b(?!\s*(?:ml|g|gm)\b)", re.I),
+    re.compile(r"\b(\d+)\s*(?:tablets?|tabs?|capsules?|caps?|softgels?|sachets?)\b", re.I),
+    re.compile(r"\b(\d+)\s*['’]s\b", re.I)
+]
+# Packs sold together: "(15 Tablets) - Pack of 2" is 30 tablets. "Pack of 15
+# Tablets" names the units, so a number the unit patterns also match is not a multiplier.
+MULTIPACK_RE = re.compile(r"\b(?:pack|combo)\s+of\s+(\d+)\b(?!\s*(?:ml|g|gm)\b)", re.I)
+# Words that describe the packaging, not the product
+PACKAGING_WORDS = {"box", "jar", "sachet", "sachets", "softgel", "softgels", "combo", "pack", "packs", "of"}
+
+# Share of the shorter title's name tokens the other title must contain to
+# treat both as the same product (marketplace titles add brand words)
+MATCH_THRESHOLD = 0.6
+
+
+def product_features(title):
+    """
+    Return (name tokens, strength, unit count, volume in ml, packs) parsed from
+    a product title. The unit count covers every pack; it is None when the
+    title gives no tablet/capsule count.
+    """
+    strength = None
+    strength_at = None
+    volume = None
+    # Positions of numbers that are already known not to be the strength
+    reserved = set()
+    for match in STRENGTH_RE.finditer(title):
+        unit = match.group(2).lower()
+        if unit == "ml":
+            volume = float(match.group(1))
+            reserved.add(match.start())
+        elif strength is None:
+            strength = f"{float(match.group(1)):g}"
+            strength_at = match.start()
+    if strength is None:
+        # "Dolo 650 Tablet": the first bare number that is not a pack size or volume
+        reserved.update(match.start(1) for pattern in (UNIT_COUNT_RES[0], UNIT_COUNT_RES[2], MULTIPACK_RE)
+                        for match in pattern.finditer(title))
+        for match in NUMBER_RE.finditer(title):
+            if match.start() not in reserved:
+                strength = f"{float(match.group()):g}"
+                strength_at = match.start()
+                break
+    count = None
+    count_at = None
+    for pattern in UNIT_COUNT_RES:
+        for match in pattern.finditer(title):
+            if int(match.group(1)) > 0 and match.start(1) != strength_at:
+                count = int(match.group(1))
+                count_at = match.start(1)
+                break
+        if count:
+            break
+    packs = 1
+    for match in MULTIPACK_RE.finditer(title):
+        if int(match.group(1)) > 0 and match.start(1) not in (strength_at, count_at):
+            packs = int(match.group(1))
+            break
+    if count:
+        count *= packs
+    names = {token for token in tokenize(title)
+             if not token[0].isdigit() and len(token) > 1
+             and token not in FORM_WORDS and token not in UNIT_WORDS and token not in PACKAGING_WORDS}
+    return names, strength, count, volume, packs
+
+
+UNIT_PREFERENCE = ["unit", "ml", "pack"]
+
+
+def _unit_price(price, count, volume, packs):
+    if not price:
+        return None, None
+    if count:
+        return price / count, "unit"
+    if volume:
+        return price / (volume * packs), "ml"
+    return price / packs, "pack"
+
+
+def match_products(results):
+    """
+    Group the same product across sources and rank the groups by value.
+
+    Titles are reduced to name-token bitmasks in one pass so every pair is
+    compared with a few integer operations; titles with the same (or an
+    unknown) strength sharing at least MATCH_THRESHOLD of the shorter
+    title's name tokens and the same release type (SR, XR, ...) are
+    merged. Each offer gets a per-unit price (per
+    tablet/capsule, per ml, or per pack when no size is given). Groups
+    available from more sources come first, then the cheapest unit price
+    among groups priced in the same unit.
+    """
+    if not results:
+        return []
+
+    bits = {}
+    offers = []
+    masks = []
+    strengths = []
+    releases = []
+    for result in results:
+        names, strength, count, volume, packs = product_features(result.get("title", ""))
+        mask = 0
+        for name in names:
+            mask |= 1 << bits.setdefault(name, len(bits))
+        unit_price, unit = _unit_price(result.get("raw_price") or 0, count, volume, packs)
+        offer = dict(result)
+        offer.update({"pack_size": count, "volume_ml": volume, "unit_price": unit_price, "unit": unit})
+        offers.append(offer)
+        masks.append(mask)
+        strengths.append(strength)
+        releases.append(names & RELEASE_WORDS)
+
+    # Union-find over the pairwise matches; a group keeps the strength of its
+    # members so unknown strengths cannot chain 500 mg and 650 mg together
+    parent = list(range(len(offers)))
+    group_strength = list(strengths)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(offers)):
+        if not masks[i]:
+            continue
+        for j in range(i + 1, len(offers)):
+            root_i, root_j = find(i), find(j)
+            if root_i == root_j or releases[i] != releases[j]:
+                continue
+            strength_i, strength_j = group_strength[root_i], group_strength[root_j]
+            if strength_i and strength_j and strength_i != strength_j:
+                continue
+            smaller = min(masks[i].bit_count(), masks[j].bit_count())
+            if smaller and (masks[i] & masks[j]).bit_count() / smaller >= MATCH_THRESHOLD:
+                parent[root_j] = root_i
+                group_strength[root_i] = strength_i or strength_j
+
+    members = {}
+    for i in range(len(offers)):
+        members.setdefault(find(i), []).append(i)
+
+    groups = []
+    for indexes in members.values():
+        group_offers = sorted((offers[i] for i in indexes),
+                              key=lambda offer: (offer["unit_price"] is None, offer["unit_price"] or 0))
+        # Unit prices are compared among the offers priced in the group's most
+        # common unit; offers of unknown pack size stay listed but unranked
+        priced = [offer for offer in group_offers if offer["unit_price"] is not None]
+        units = [offer["unit"] for offer in priced]
+        unit = max(UNIT_PREFERENCE, key=lambda candidate: (units.count(candidate), -UNIT_PREFERENCE.index(candidate)))
+        comparable = [offer for offer in priced if offer["unit"] == unit]
+        best = comparable[0] if comparable else None
+        groups.append({
+            "title": (best or group_offers[0])["title"],
+            "strength": group_strength[find(indexes[0])],
+            "offers": group_offers,
+            "sources": sorted({offer.get("source") for offer in group_offers if offer.get("source")}),
+            "best": best,
+            "best_unit_price": best["unit_price"] if best else None,
+            "unit": unit if best else None,
+            "max_unit_price": comparable[-1]["unit_price"] if comparable else None
+        })
+
+    # Unit prices of different kinds (per tablet, per ml, per pack) are never
+    # compared with each other: groups are ordered by unit kind before price
+    groups.sort(key=lambda group: (-len(group["sources"]), group["best_unit_price"] is None,
+                                   UNIT_PREFERENCE.index(group["unit"]) if group["unit"] else 0,
+                                   group["best_unit_price"] or 0))
+    return groups
@@ -0,0 +1,150 @@
+from datetime import datetime
+from urllib.parse import urlparse
+import http_client
+import soupsieve
+from html_parsing import make_soup, compile_spec, extract
+from price_parsing import find_price_string
+from result_cache import TTLCache
+
+PRODUCT_PAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Accept": "text/html"
+}
+
+# Extracted product records keyed by (source, url). Fresh records are served
+# without any upstream request; for a day after that they are kept so they
+# can be revalidated with ETag/Last-Modified instead of downloaded again.
+product_cache = TTLCache(max_entries=1000, ttl=10 * 60, stale_ttl=24 * 60 * 60)
+# A product page stored by the raw response store this recently (e.g. by the
+# PharmEasy deep fetch during a search) is parsed again instead of downloaded
+PRODUCT_PAGE_MAX_AGE = 10 * 60
+
+
+def _amazon_title(name):
+    # Page titles read "Amazon.in: <product> : <category>"
+    return name.split(":", 1)[0].strip() if "Amazon.in" in name else name
+
+
+# Per-source fields of a product page, compiled once at import
+PRODUCT_PAGE_SPECS = {
+    "PharmEasy": compile_spec({
+        "name": {"select": [".MedicineOverviewSection_medicineName__dHDQZ, h1.ProductTitle_product-title__OkCXo, h1[class*='product-title'], h1[class*='medicineName'], .medicine-name, .product-title"]},
+        "price": {"select": [".PriceInfo_ourPrice__jFYXr, div[class*='Price'], span[class*='Price'], div[class*='price'], span[class*='price'], div[class*='MRP'], span[class*='MRP']"],
+                  "fallback": find_price_string},
+        "image": {"select": [".ProductImageCarousel_carousel-img__cJgkZ, .style__image___Sd7O3, img[class*='product'], img[class*='medicine'], .product-image img, .medicine-image img"],
+                  "get": ["src"]},
+        "description": {"select": [".ProductDescription_product-description__gAYip, .MedicineOverviewSection_medicineOverview__yR8HD, div[class*='description'], div[class*='overview'], div[class*='details'], .product-details"]}
+    }),
+    "Tata 1mg": compile_spec({
+        "name": {"select": [".DrugHeader__title___2ZZX_ h1, .ProductTitle__product-title___3QMYH, h1[class*='title'], h1[class*='name'], div.DrugHeader__title-content___2ZZX_"]},
+        "price": {"select": [".PriceBoxPlanOption__offer-price___3v_Nd, .ProductPriceBox__price___11Tjr, div[class*='price'], span[class*='price'], div[class*='offer-price']"],
+                  "fallback": find_price_string},
+        "image": {"select": [".ProductImage__image-container___2_MWm img, .style__image-container___2G57K img, img[class*='product'], img.style__product-image___1bkbA"],
+                  "get": ["src"]},
+        "description": {"select": [".ProductDescription_description-content___A_qCZ, .DrugOverview__content___2ZZX_, div[class*='description'], div[class*='overview']"]}
+    }),
+    "Amazon": compile_spec({
+        "name": {"select": ["#productTitle, #title, h1", "title"], "post": _amazon_title},
+        "price": {"select": [".a-price .a-offscreen", ".a-price", "#priceblock_ourprice", "#priceblock_dealprice", "#priceblock_saleprice"],
+                  "fallback": find_price_string},
+        # Prefer the best quality image URL Amazon exposes
+        "image": {"select": ["#landingImage", "#imgBlkFront", "img[id*='image'], img[data-old-hires]", "img[src*='product'], img[src*='large']", "img"],
+                  "get": ["data-old-hires", "src"]},
+        "description": {"select": ["#productDescription", "#feature-bullets", ".product-description", "[id$='-description']"]}
+    })
+}
+
+# Fallbacks for fields the source spec did not find
+GENERIC_PAGE_SPEC = compile_spec({
+    "name": {"select": ["h1", "title"]},
+    "image": {"select": ["img[src*='product'], img[src*='large']", "img"], "get": ["src"]}
+})
+# Tried in order for a longer description; (compiled selector, read the content attribute)
+DESCRIPTION_CANDIDATES = [
+    (soupsieve.compile(selector), selector.startswith("meta"))
+    for selector in ["meta[name='description']", "meta[property='og:description']", ".product-description",
+                     "[class*='description']", "[class*='info']", "[class*='detail']"]
+]
+
+
+def extract_product_record(soup, source, product_url):
+    """Run the source's compiled extraction spec over a product page, then the generic fallbacks."""
+    fields = extract(soup, PRODUCT_PAGE_SPECS[source]) if source in PRODUCT_PAGE_SPECS else {}
+    product_name = fields.get("name") or "Product Name"
+    product_price = fields.get("price") or "Price not available"
+    product_image = fields.get("image")
+    product_description = fields.get("description") or "No description available"
+    
+    # Generic fallbacks for missing data
+    if product_name == "Product Name" or not product_image:
+        generic = extract(soup, GENERIC_PAGE_SPEC)
+        if product_name == "Product Name" and generic["name"]:
+            product_name = generic["name"]
+        if not product_image and generic["image"]:
+            product_image = generic["image"]
+            if not product_image.startswith(("http://", "https://")):
+                parsed_url = urlparse(product_url)
+                base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+                product_image = base_url + product_image if not product_image.startswith("/") else base_url + product_image
+    
+    # Try to extract better descriptions
+    if product_description == "No description available" or len(product_description) < 50:
+        # Look for any other elements that might contain descriptions
+        for pattern, is_meta in DESCRIPTION_CANDIDATES:
+            desc_elem = pattern.select_one(soup)
+            if desc_elem:
+                if is_meta:
+                    content = desc_elem.get("content", "")
+                    if content and len(content) > len(product_description):
+                        product_description = content
+                else:
+                    text = desc_elem.get_text(strip=True)
+                    if text and len(text) > len(product_description):
+                        product_description = text
+                
+                if product_description != "No description available" and len(product_description) > 50:
+                    break
+
+    return {
+        "name": product_name,
+        "price": product_price,
+        "image": product_image,
+        "description": product_description
+    }
+
+
+def fetch_product_record(product_url, source):
+    """
+    Return (record, status_code) for a product page, using the product cache.
+    Stale records are revalidated with If-None-Match/If-Modified-Since when
+    the upstream sent validators; otherwise the page is fetched again.
+    record is None when the upstream did not return the page.
+    """
+    cache_key = (source, product_url)
+    entry, state = product_cache.get(cache_key)
+    if state == "fresh":
+        return entry["record"], 200
+
+    headers = dict(PRODUCT_PAGE_HEADERS)
+    if entry:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = http_client.get(product_url, headers=headers, timeout=15, max_age=PRODUCT_PAGE_MAX_AGE)
+    if response.status_code == 304 and entry:
+        # Unchanged upstream: keep the parsed record and restart its TTL
+        product_cache.set(cache_key, entry)
+        return entry["record"], 200
+    if response.status_code != 200:
+        return None, response.status_code
+
+    record = extract_product_record(make_soup(response.text), source, product_url)
+    record["fetched_at"] = datetime.now()
+    product_cache.set(cache_key, {
+        "record": record,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified")
+    })
+    return record, 200
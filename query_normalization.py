@@ -0,0 +1,122 @@
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+# Combining marks (Devanagari vowel signs and viramas, accents) belong to the
+# letters they follow; Python's \w does not count them as word characters
+_MARKS = "".join(chr(code) for code in range(0x300, 0x10000) if unicodedata.category(chr(code)).startswith("M"))
+# Letter runs in any script and numbers (with decimals) are the only parts of a
+# query that matter; splitting on them also separates "dolo650" and "650mg".
+TOKEN_RE = re.compile(rf"[^\W\d_](?:[^\W\d_]|[{re.escape(_MARKS)}])*|\d+(?:\.\d+)?")
+
+# Dosage units and dosage forms that do not identify the medicine
+UNIT_WORDS = {"mg", "mcg", "g", "gm", "gms", "ml", "iu", "kg"}
+FORM_WORDS = {
+    "tablet", "tablets", "tab", "tabs", "capsule", "capsules", "cap", "caps",
+    "syrup", "suspension", "injection", "drop", "drops", "strip", "strips", "bottle"
+}
+# Release types name a different formulation ("Dolo 650 SR" is not "Dolo 650"),
+# so they stay in the key and products only match within the same one
+RELEASE_WORDS = {"sr", "er", "xr", "mr", "cr", "od", "dt"}
+
+# Alphabetic tokens shorter than this are never spell-corrected
+MIN_FUZZY_LENGTH = 4
+# Minimum trigram similarity (shared / union) for a correction
+FUZZY_THRESHOLD = 0.5
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold())
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Known medicine name words, looked up by trigram similarity to correct misspellings."""
+
+    def __init__(self, threshold=FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self._postings = defaultdict(set)
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __contains__(self, word):
+        return word in self._sizes
+
+    def add(self, word):
+        if len(word) < MIN_FUZZY_LENGTH or not word.isalpha() or word in self._sizes:
+            return
+        grams = _trigrams(word)
+        with self._lock:
+            self._sizes[word] = len(grams)
+            for gram in grams:
+                self._postings[gram].add(word)
+
+    def add_text(self, text):
+        """Index the name words of a product title or query."""
+        for token in tokenize(text):
+            if token not in FORM_WORDS and token not in UNIT_WORDS:
+                self.add(token)
+
+    def best_match(self, word):
+        """
+        Return the most similar known word at or above the threshold, or None.
+        A word containing `word` or contained in it is never a match: that is
+        usually a related but different drug (omeprazole, esomeprazole).
+        """
+        grams = _trigrams(word)
+        shared = Counter()
+        with self._lock:
+            for gram in grams:
+                shared.update(self._postings.get(gram, ()))
+            best, best_score = None, self.threshold
+            for candidate, count in shared.items():
+                if word in candidate or candidate in word:
+                    continue
+                score = count / (len(grams) + self._sizes[candidate] - count)
+                if score > best_score or (score == best_score and best is None):
+                    best, best_score = candidate, score
+        return best
+
+    def correct(self, word):
+        if len(word) < MIN_FUZZY_LENGTH or not word.isalpha() or word in self._sizes:
+            return word
+        return self.best_match(word) or word
+
+
+# Filled from the product catalog as items are scraped (see catalog.py)
+medicine_names = TrigramIndex()
+
+
+def canonical_query(query):
+    """
+    Canonical cache/index key for a search query: lowercase name words and
+    strengths only, with units, dosage forms and punctuation removed.
+    "Dolo 650", "dolo-650 tablet" and "DOLO650" all become "dolo 650".
+    The key never depends on which names are known, so every process
+    stores the same query under the same key. It is empty for a query with
+    no letters or digits; callers must not cache or share results under it.
+    """
+    tokens = tokenize(query)
+    kept = [token for token in tokens if token not in UNIT_WORDS and token not in FORM_WORDS]
+    # A query made only of form words ("syrup") is still a query
+    if not kept:
+        kept = tokens
+    return " ".join(kept)
+
+
+def suggest_query(query, names=medicine_names):
+    """
+    The canonical query with misspelled names mapped onto known ones, for a
+    "did you mean" link; None if nothing would change. Never used as a key.
+    """
+    key = canonical_query(query)
+    corrected = " ".join(names.correct(token) for token in key.split())
+    return corrected if corrected != key else None
@@ -0,0 +1,68 @@
+import heapq
+import math
+
+from query_normalization import canonical_query, tokenize
+
+# Weights of the unified score. Each component is scaled to 0..1:
+#   relevance  - share of the query's terms found in the title
+#   popularity - the score the source ranked by, relative to that source's best
+#                (sources score on different scales)
+#   price      - cheapest priced result / this result's price
+RANKING_WEIGHTS = {"relevance": 0.5, "popularity": 0.3, "price": 0.2}
+RESULTS_PER_PAGE = 15
+
+# Numeric fields the scrapers keep on their candidates; summed, they are the source's own sort key
+SOURCE_SCORE_FIELDS = ("popularity", "ratings", "relevance")
+
+
+def _relevance(title, query_terms):
+    if not query_terms:
+        return 0.0
+    title_terms = tokenize(title)
+    found = sum(1 for term in query_terms if any(word.startswith(term) for word in title_terms))
+    return found / len(query_terms)
+
+
+def _source_score(result):
+    return sum(result.get(field) or 0 for field in SOURCE_SCORE_FIELDS)
+
+
+def score_results(results, query, weights=None):
+    """Return copies of `results` with a unified "score" computed over all of them."""
+    weights = weights or RANKING_WEIGHTS
+    query_terms = canonical_query(query).split()
+    best_popularity = {}
+    for result in results:
+        source = result.get("source")
+        best_popularity[source] = max(best_popularity.get(source, 0), _source_score(result))
+    prices = [result["raw_price"] for result in results if (result.get("raw_price") or 0) > 0]
+    cheapest = min(prices) if prices else None
+
+    scored = []
+    for result in results:
+        best = best_popularity[result.get("source")]
+        popularity = math.log1p(_source_score(result)) / math.log1p(best) if best > 0 else 0.0
+        price = result.get("raw_price") or 0
+        score = (weights.get("relevance", 0) * _relevance(result.get("title", ""), query_terms)
+                 + weights.get("popularity", 0) * popularity
+                 + weights.get("price", 0) * (cheapest / price if cheapest and price > 0 else 0.0))
+        scored.append(dict(result, score=round(score, 4)))
+    return scored
+
+
+def top_k(scored_results, k):
+    """The k highest scored results, best first; ties keep their fan-out order."""
+    return [result for _, _, result in heapq.nlargest(
+        k, ((result["score"], -index, result) for index, result in enumerate(scored_results)))]
+
+
+def rank_page(results, query, page=1, per_page=RESULTS_PER_PAGE, weights=None):
+    """
+    Score every candidate from every source and return (page_results, page, total_pages);
+    out of range pages are clamped. Only the top page * per_page candidates are
+    selected, with a heap.
+    """
+    scored = score_results(results, query, weights)
+    total_pages = max(1, math.ceil(len(scored) / per_page))
+    page = min(max(page, 1), total_pages)
+    return top_k(scored, page * per_page)[(page - 1) * per_page:], page, total_pages
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+# Format of occurrence times, as stored in notifications.scheduled_time
+OCCURRENCE_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def parse_occurrence(text):
+    return datetime.strptime(text, OCCURRENCE_FORMAT)
+
+
+def format_occurrence(moment):
+    return moment.strftime(OCCURRENCE_FORMAT)
+
+
+def dose_occurrences(time_of_day, frequency_hours, start_date, end_date, window_start, window_end,
+                     active_from=None, active_until=None):
+    """
+    Yield the datetimes in [window_start, window_end) at which a dose is due.
+
+    Each day from start_date to end_date (inclusive; open-ended when
+    end_date is empty) has a first dose at time_of_day, then one every
+    frequency_hours until the day ends. Occurrences before active_from (when
+    the dose was created) are not generated, so adding a dose never
+    back-fills reminders for earlier today; a dose retired by an edit stops
+    at active_until.
+    """
+    first_dose = datetime.strptime(time_of_day, '%H:%M').time()
+    step = timedelta(hours=max(1, int(frequency_hours)))
+    lower = max(window_start, active_from) if active_from else window_start
+    if active_until:
+        window_end = min(window_end, active_until)
+    day = max(datetime.strptime(start_date, '%Y-%m-%d').date(), lower.date())
+    last_day = (window_end - timedelta(microseconds=1)).date()
+    if end_date:
+        last_day = min(last_day, datetime.strptime(end_date, '%Y-%m-%d').date())
+    while day <= last_day:
+        moment = datetime.combine(day, first_dose)
+        while moment.date() == day and moment < window_end:
+            if moment >= lower:
+                yield moment
+            moment += step
+        day += timedelta(days=1)
+
+
+def is_occurrence(dose, moment):
+    """True if `moment` is one of the dose's occurrences; `dose` is a row as taken by expand()."""
+    return any(dose_occurrences(dose['time_of_day'], dose['frequency_hours'], dose['start_date'],
+                                dose['end_date'], moment, moment + timedelta(minutes=1), *_active_range(dose)))
+
+
+def _active_range(dose):
+    return tuple(parse_occurrence(dose[key]) if dose[key] else None for key in ('active_from', 'active_until'))
+
+
+def expand(doses, window_start, window_end, statuses=None):
+    """
+    Occurrences of every dose in [window_start, window_end), sorted by time.
+    `doses` are rows joining medicine_doses with their routine (dose_id,
+    routine_id, time_of_day, frequency_hours, active_from, active_until, dosage,
+    instructions, start_date, end_date, medicine_name, priority).
+    `statuses` maps (dose_id, scheduled_time) to the status stored for the
+    occurrences the user acted on; every other occurrence is "pending".
+    """
+    statuses = statuses or {}
+    occurrences = []
+    for dose in doses:
+        for moment in dose_occurrences(dose['time_of_day'], dose['frequency_hours'], dose['start_date'],
+                                       dose['end_date'], window_start, window_end, *_active_range(dose)):
+            scheduled_time = format_occurrence(moment)
+            occurrences.append({
+                'dose_id': dose['dose_id'],
+                'routine_id': dose['routine_id'],
+                'scheduled_time': scheduled_time,
+                'status': statuses.get((dose['dose_id'], scheduled_time), 'pending'),
+                'medicine_name': dose['medicine_name'],
+                'priority': dose['priority'],
+                'dosage': dose['dosage'],
+                'instructions': dose['instructions'],
+                'time_of_day': dose['time_of_day']
+            })
+    occurrences.sort(key=lambda occurrence: occurrence['scheduled_time'])
+    return occurrences
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Headers describing the wire encoding; bodies are stored already decoded
+_WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+MODES = ("off", "record", "replay")
+
+# Bodies are compressed in the scraper's thread, so favour speed over size
+COMPRESS_LEVEL = 1
+# A store with a max_age drops older entries in the background at most this often (seconds)
+PRUNE_INTERVAL = 60 * 60
+
+
+class ResponseStore:
+    """
+    Content-addressed, gzip-compressed store of raw upstream responses.
+
+    Bodies live under objects/ named by the SHA-256 of their content, so
+    identical pages are stored once. index/ holds one JSON record per URL
+    (url, status, headers, fetched_at, body digest) pointing at the latest
+    body fetched for it. Files are written to a temporary name and renamed,
+    so concurrent writers never leave a partial entry. With `max_age`
+    (seconds) set, save() prunes older entries in a background thread once
+    every PRUNE_INTERVAL.
+    """
+
+    def __init__(self, root, max_age=None):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_dir = os.path.join(root, "index")
+        self.max_age = max_age
+        self._next_prune = 0
+        self._prune_lock = threading.Lock()
+
+    def _index_path(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.index_dir, digest[:2], digest + ".json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest + ".gz")
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def save(self, url, response):
+        """Store `response` as the latest copy of `url`."""
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            # Marks the body as in use for a prune running concurrently
+            os.utime(object_path)
+        else:
+            self._write_atomic(object_path, gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        entry = {
+            "url": url,
+            "status": response.status_code,
+            "headers": {name: value for name, value in response.headers.items()
+                        if name.lower() not in _WIRE_HEADERS},
+            "fetched_at": time.time(),
+            "body": digest
+        }
+        self._write_atomic(self._index_path(url), json.dumps(entry).encode("utf-8"))
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        if self.max_age is None:
+            return
+        with self._prune_lock:
+            now = time.monotonic()
+            if now < self._next_prune:
+                return
+            self._next_prune = now + PRUNE_INTERVAL
+        threading.Thread(target=self._prune_in_background, name="response-store-prune", daemon=True).start()
+
+    def _prune_in_background(self):
+        try:
+            removed = self.prune(self.max_age)
+            logger.info(f"Pruned {removed} stored responses older than {self.max_age}s")
+        except OSError as e:
+            logger.error(f"Failed to prune the response store: {str(e)}")
+
+    def lookup(self, url):
+        """Return the index entry for `url`, or None."""
+        try:
+            with open(self._index_path(url), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def load(self, url, max_age=None):
+        """Return the stored response for `url` as a requests.Response, or None if missing or older than max_age seconds."""
+        entry = self.lookup(url)
+        if entry is None or (max_age is not None and time.time() - entry["fetched_at"] > max_age):
+            return None
+        try:
+            with open(self._object_path(entry["body"]), "rb") as f:
+                body = gzip.decompress(f.read())
+        except OSError:
+            return None
+        return build_response(entry, body)
+
+    def iter_entries(self):
+        """Yield (entry, body) for every stored URL, e.g. to re-run parsers offline."""
+        if not os.path.isdir(self.index_dir):
+            return
+        for directory, _, files in os.walk(self.index_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(directory, name), "rb") as f:
+                        entry = json.loads(f.read())
+                    with open(self._object_path(entry["body"]), "rb") as f:
+                        yield entry, gzip.decompress(f.read())
+                except (OSError, ValueError, KeyError):
+                    continue
+
+    def prune(self, max_age):
+        """Drop index entries older than max_age seconds and bodies no entry refers to; returns entries removed."""
+        removed = 0
+        referenced = set()
+        started = time.time()
+        cutoff = started - max_age
+        for directory, _, files in os.walk(self.index_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, "rb") as f:
+                        entry = json.loads(f.read())
+                except (OSError, ValueError):
+                    continue
+                if entry.get("fetched_at", 0) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+                else:
+                    referenced.add(entry.get("body"))
+        for directory, _, files in os.walk(self.objects_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                # Bodies written or reused since the scan started may belong to entries it did not see
+                if name.endswith(".gz") and name[:-3] not in referenced and os.path.getmtime(path) < started:
+                    os.unlink(path)
+        return removed
+
+
+def build_response(entry, body):
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.reason = "OK" if entry["status"] == 200 else ""
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.url = entry["url"]
+    response._content = body
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def missing_response(url):
+    """Stand-in for a URL absent from the store in replay mode."""
+    response = requests.Response()
+    response.status_code = 504
+    response.reason = "Not in response store"
+    response.url = url
+    response._content = b""
+    return response
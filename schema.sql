@@ -1,6 +1,10 @@
 -- schema.sql
 
 -- Drop existing tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS catalog_queries;
+DROP TABLE IF EXISTS products_fts;
+DROP TABLE IF EXISTS products;
+DROP TABLE IF EXISTS popular_prices;
 DROP TABLE IF EXISTS notifications;
 DROP TABLE IF EXISTS medicine_doses;
 DROP TABLE IF EXISTS medicine_routines;
@@ -49,9 +53,13 @@ CREATE TABLE IF NOT EXISTS medicine_doses (
     frequency_hours INTEGER NOT NULL,
     dosage TEXT NOT NULL,
     instructions TEXT,
+    active_from TEXT,
+    active_until TEXT,
     FOREIGN KEY (routine_id) REFERENCES medicine_routines (id)
 );
 
+-- Dose occurrences are generated from medicine_doses on demand; only the
+-- ones the user acted on (taken, skipped) or that were sent are stored
 CREATE TABLE IF NOT EXISTS notifications (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
@@ -66,11 +74,57 @@ CREATE TABLE IF NOT EXISTS notifications (
     FOREIGN KEY (dose_id) REFERENCES medicine_doses (id)
 );
 
+-- Prices precomputed by the background crawler for the most searched queries
+CREATE TABLE IF NOT EXISTS popular_prices (
+    query_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    results TEXT NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (query_key, source)
+);
+
+-- Product catalog of every scraped item, full-text indexed by title (see catalog.py)
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    price TEXT,
+    raw_price REAL,
+    scraped_at TIMESTAMP NOT NULL,
+    UNIQUE (source, link)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    title, content='products', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts(rowid, title) VALUES (new.id, new.title);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE OF title ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO products_fts(rowid, title) VALUES (new.id, new.title);
+END;
+
+-- When each source was last scraped for each normalized query
+CREATE TABLE IF NOT EXISTS catalog_queries (
+    query_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    scraped_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (query_key, source)
+);
+
 
 -- Create indices for faster queries
 CREATE INDEX idx_search_history_user_id ON search_history(user_id);
 CREATE INDEX idx_medicine_routines_user_id ON medicine_routines(user_id);
 CREATE INDEX idx_medicine_doses_routine_id ON medicine_doses(routine_id);
-CREATE INDEX idx_notifications_user_id ON notifications(user_id);
-CREATE INDEX idx_notifications_scheduled_time ON notifications(scheduled_time);
-CREATE INDEX idx_notifications_status ON notifications(status);
\ No newline at end of file
+CREATE INDEX idx_notifications_user_time ON notifications(user_id, scheduled_time, status, dose_id);
+CREATE INDEX idx_notifications_routine_id ON notifications(routine_id);
+CREATE UNIQUE INDEX idx_notifications_occurrence ON notifications(dose_id, scheduled_time);
\ No newline at end of file
@@ -0,0 +1,234 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import http_client
+from result_cache import TTLCache
+from query_normalization import canonical_query
+from metrics import SEARCH_CACHE_LOOKUPS, SOURCE_SCRAPE_SECONDS
+from source_health import pop_empty_page
+
+# One pool shared by every request. A scraper that misses the deadline keeps
+# running here in the background instead of holding up the request that gave
+# up on it.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="search-source")
+
+# Per-source results keyed by (source name, canonical query). Fresh for 15
+# minutes, then served stale for up to 6 hours while a refresh runs.
+search_cache = TTLCache(max_entries=2000, ttl=15 * 60, stale_ttl=6 * 60 * 60)
+
+# Scrapes currently running, by cache key. Identical concurrent searches wait
+# on the same future instead of scraping the source again.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+# Statuses of sources that contributed no answer; results are partial without them
+MISSING_STATUSES = ("timeout", "skipped", "error")
+
+
+def scrape_source(source, encoded_query, query, user_agents, logger):
+    """
+    Run one scraper under its source's adaptive timeout and record the outcome
+    on the source's health. Returns (results, answered); answered is False
+    when the source failed (error status, exception, unparseable page) rather
+    than listing no products.
+    """
+    health = source.get("health")
+    started = time.monotonic()
+    results = []
+    answered = False
+    pop_empty_page()
+    try:
+        # Upstream requests may not outlive the source's adaptive timeout
+        with http_client.timeout_limit(health.timeout() if health else None):
+            results = source["function"](encoded_query, query, user_agents, logger) or []
+        # Scrapers log and swallow their own errors and return nothing, so an
+        # empty result only counts as an answer if the scraper parsed an empty page
+        answered = bool(results) or pop_empty_page()
+    finally:
+        SOURCE_SCRAPE_SECONDS.observe(time.monotonic() - started, source=source["name"])
+        if health:
+            if answered:
+                health.record_success(time.monotonic() - started)
+            else:
+                health.record_failure(time.monotonic() - started)
+    return results, answered
+
+
+def _run_source(source, encoded_query, query, user_agents, logger, cache_key):
+    results, answered = scrape_source(source, encoded_query, query, user_agents, logger)
+    # A failed scrape is not cached; a source that has no such products is
+    if answered and cache_key is not None:
+        search_cache.set(cache_key, [dict(result) for result in results])
+    return results, answered
+
+
+def _forget_in_flight(cache_key, future):
+    with _in_flight_lock:
+        if _in_flight.get(cache_key) is future:
+            del _in_flight[cache_key]
+
+
+def _submit_once(cache_key, fn, *args):
+    """Return (future, started) for cache_key, joining the scrape already in flight if there is one."""
+    with _in_flight_lock:
+        future = _in_flight.get(cache_key)
+        if future is not None:
+            return future, False
+        future = _executor.submit(fn, *args)
+        _in_flight[cache_key] = future
+    future.add_done_callback(lambda done: _forget_in_flight(cache_key, done))
+    return future, True
+
+
+def _refresh_source(source, encoded_query, query, user_agents, logger, cache_key):
+    try:
+        _run_source(source, encoded_query, query, user_agents, logger, cache_key)
+    except Exception as e:
+        logger.error(f"Background refresh of {source['name']} failed: {str(e)}")
+    finally:
+        search_cache.end_refresh(cache_key)
+
+
+def iter_source_results(sources, encoded_query, query, user_agents, logger, deadline, precomputed=None):
+    """
+    Run every source concurrently and yield (source_name, results, status)
+    as each one finishes. status is "cached", "precomputed", "ok", "error",
+    "skipped" or "timeout". Cached sources are yielded first without touching
+    the network, stale ones are refreshed in the background. `precomputed`
+    maps source names to results already known (price crawler, product catalog);
+    those sources are served from it and seeded into the cache. Sources whose circuit is open
+    are "skipped"; the others get min(deadline, their adaptive timeout)
+    seconds before they are yielded as "timeout". A source already being
+    scraped for the same query by another request is waited on, not re-scraped.
+    A query without a canonical key is scraped without the cache or joining.
+    """
+    started = time.monotonic()
+    precomputed = precomputed or {}
+    query_key = canonical_query(query)
+    pending = {}
+    cached = []
+    skipped = []
+    for source in sources:
+        health = source.get("health")
+        if not query_key:
+            if health and not health.allow_request():
+                skipped.append(source["name"])
+                continue
+            budget = min(deadline, health.timeout()) if health else deadline
+            future = _executor.submit(_run_source, source, encoded_query, query, user_agents, logger, None)
+            pending[future] = (source["name"], started + budget)
+            continue
+        cache_key = (source["name"], query_key)
+        cached_results, state = search_cache.get(cache_key)
+        if cached_results is None and precomputed.get(source["name"]):
+            search_cache.set(cache_key, precomputed[source["name"]])
+            SEARCH_CACHE_LOOKUPS.inc(source=source["name"], result="precomputed")
+            cached.append((source["name"], precomputed[source["name"]], "precomputed"))
+            continue
+        if cached_results is not None:
+            SEARCH_CACHE_LOOKUPS.inc(source=source["name"], result=state)
+            if (state == "stale" and (health is None or health.allow_request())
+                    and search_cache.begin_refresh(cache_key)):
+                _executor.submit(_refresh_source, source, encoded_query, query, user_agents, logger, cache_key)
+            cached.append((source["name"], cached_results, "cached"))
+            continue
+        if health and not health.allow_request():
+            skipped.append(source["name"])
+            continue
+        budget = min(deadline, health.timeout()) if health else deadline
+        future, started_here = _submit_once(cache_key, _run_source, source, encoded_query, query,
+                                            user_agents, logger, cache_key)
+        SEARCH_CACHE_LOOKUPS.inc(source=source["name"], result="miss" if started_here else "joined")
+        if not started_here:
+            logger.info(f"Joining in-flight search of {source['name']} for '{cache_key[1]}'")
+        pending[future] = (source["name"], started + budget)
+
+    for name, cached_results, status in cached:
+        # Hand out copies so callers can never mutate the cached entries
+        yield name, [dict(result) for result in cached_results], status
+
+    for name in skipped:
+        logger.warning(f"Skipping {name}: circuit open after repeated failures")
+        yield name, [], "skipped"
+
+    while pending:
+        now = time.monotonic()
+        for future in [future for future, (_, expires) in pending.items() if expires <= now]:
+            # Not cancelled: other requests may be waiting on the same scrape,
+            # and a late result still fills the cache
+            name, expires = pending.pop(future)
+            logger.warning(f"{name} missed its {expires - started:.1f}s search budget")
+            yield name, [], "timeout"
+        if not pending:
+            break
+        next_expiry = min(expires for _, expires in pending.values())
+        done, _ = wait(pending, timeout=next_expiry - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            name, _ = pending.pop(future)
+            try:
+                results, answered = future.result()
+            except Exception as e:
+                logger.error(f"Error searching {name}: {str(e)}")
+                yield name, [], "error"
+                continue
+            if not answered:
+                logger.warning(f"{name} failed to answer the search")
+                yield name, [], "error"
+                continue
+            # The future may be shared with other requests, so hand out copies
+            yield name, [dict(result) for result in results], "ok"
+
+
+def uncached_sources(sources, query):
+    """Names of the sources with no cached results for `query`, the only ones worth looking up elsewhere."""
+    query_key = canonical_query(query)
+    return [source["name"] for source in sources
+            if not query_key or not search_cache.contains((source["name"], query_key))]
+
+
+def cached_results(sources, query, precomputed=None):
+    """
+    Every source's candidates for `query` that are already known, without
+    scraping: cached results (fresh or stale), else `precomputed` ones.
+    Returns (results, missing_sources) like fan_out; missing_sources lists
+    the sources with neither.
+    """
+    precomputed = precomputed or {}
+    query_key = canonical_query(query)
+    results = []
+    missing_sources = []
+    for source in sources:
+        found = search_cache.get((source["name"], query_key))[0] if query_key else None
+        if found is None:
+            found = precomputed.get(source["name"])
+        if found is None:
+            missing_sources.append(source["name"])
+            continue
+        results.extend(dict(result) for result in found)
+    return results, missing_sources
+
+
+def fan_out(sources, encoded_query, query, user_agents, logger, deadline, precomputed=None, on_scraped=None):
+    """
+    Search all sources in parallel under one overall deadline.
+    Returns (results, missing_sources); results keep the order of `sources`
+    and missing_sources lists the sources that timed out, were skipped or failed.
+    `on_scraped(source_name, results)` is called for every source that was
+    actually scraped during this call.
+    """
+    by_source = {}
+    missing_sources = []
+    for name, source_results, status in iter_source_results(sources, encoded_query, query, user_agents,
+                                                            logger, deadline, precomputed):
+        if status in MISSING_STATUSES:
+            missing_sources.append(name)
+            continue
+        by_source[name] = source_results
+        if status == "ok" and on_scraped:
+            on_scraped(name, source_results)
+        logger.info(f"Found {len(source_results)} results from {name}")
+
+    results = []
+    for source in sources:
+        results.extend(by_source.get(source["name"], []))
+    return results, missing_sources
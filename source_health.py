@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+
+# Set by a scraper, in the thread running it, when the source answered with a
+# page that parsed but listed no products
+_scrape = threading.local()
+
+
+def report_empty_page():
+    """Called by a scraper whose source answered but had no matching products, so its empty result is not a failure."""
+    _scrape.empty_page = True
+
+
+def pop_empty_page():
+    """True if the scraper that last ran in this thread reported an empty page; resets the flag."""
+    empty_page = getattr(_scrape, "empty_page", False)
+    _scrape.empty_page = False
+    return empty_page
+
+
+class SourceHealth:
+    """
+    Circuit breaker and latency tracker for one search source.
+
+    After `failure_threshold` consecutive failures the circuit opens and the
+    source is skipped. Once `reset_timeout` seconds have passed a single
+    probe request is let through (half-open); its success closes the circuit,
+    its failure opens it again. The per-request timeout follows the observed
+    p95 latency instead of a fixed value.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30,
+                 min_timeout=3, max_timeout=10, window=50):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a request may be sent to this source now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self.consecutive_failures = 0
+            self.state = "closed"
+            self._probe_in_flight = False
+
+    def record_failure(self, latency=None):
+        with self._lock:
+            if latency is not None:
+                self._latencies.append(latency)
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def latency_percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        rank = min(max(int(round(pct / 100 * len(samples))) - 1, 0), len(samples) - 1)
+        return samples[rank]
+
+    def timeout(self):
+        """Per-request budget in seconds: 1.5x the observed p95, clamped to [min, max]."""
+        if len(self._latencies) < 5:
+            return self.max_timeout
+        p95 = self.latency_percentile(95)
+        return min(max(p95 * 1.5, self.min_timeout), self.max_timeout)
+
+    def snapshot(self):
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "timeout": round(self.timeout(), 2),
+            "p50_latency": round(p50, 3) if p50 is not None else None,
+            "p95_latency": round(p95, 3) if p95 is not None else None
+        }
@@ -1,11 +1,34 @@
-import requests
-from bs4 import BeautifulSoup
+import http_client
+from metrics import SCRAPER_STRATEGY
+from source_health import report_empty_page
+from html_parsing import make_soup, find_json_script, compile_spec, extract
+from price_parsing import parse_price, first_number, first_int
 import random
-import re
-import json
+import soupsieve
+
+# Candidates returned per search; ranking and paging happen after the fan-out
+MAX_CANDIDATES = 10
+
+# Result card layouts, tried in order
+ITEM_PATTERNS = [
+    soupsieve.compile(".style__product-box___3oEU6"),
+    soupsieve.compile(".style__horizontal-card___1Zwmt"),
+    soupsieve.compile(".style__product-grid___3ZQ7D div[data-auto-id='product-grid-card']")
+]
+ITEM_SPEC = compile_spec({
+    "title": {"select": ["[data-auto-id='product-name']", ".style__pro-title___3zxNC", "a[title]", ".style__product-title___1Pst1"],
+              "get": ["text", "title"], "default": "Unknown Product"},
+    "link": {"select": ["a[href]"], "get": ["href"], "default": "#"},
+    "price": {"select": [".style__price-tag___B2csA", ".style__discount-price___25Bya"], "default": "Price not available"},
+    "rating": {"select": [".style__rating___1T2L8, .style__rating-wrap___2oUm3"], "post": first_number, "default": 0},
+    "rating_count": {"select": [".style__rating-count___2oUm3"], "post": first_int, "default": 0}
+})
 
 def search_tata1mg(encoded_query, query, user_agents, logger):
     tata1mg_results = []
+    strategy = None
+    # The page came back and parsed; if it listed nothing, the medicine just is not stocked
+    answered = False
     try:
         # Use different sort parameters to get most bought/reviewed products
         tata1mg_url = f"https://www.1mg.com/search/all?name={encoded_query}&sort=popularity"
@@ -15,28 +38,22 @@ def search_tata1mg(encoded_query, query, user_agents, logger):
             "Cache-Control": "no-cache"
         }
         
-        response = requests.get(tata1mg_url, headers=headers, timeout=10)
+        response = http_client.get(tata1mg_url, headers=headers, timeout=10)
         
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            # Try to extract data from script tags first - more reliable
-            script_data = None
-            for script in soup.find_all('script', type='application/json'):
-                try:
-                    data = json.loads(script.string)
-                    if isinstance(data, dict) and "data" in data:
-                        script_data = data
-                        break
-                except:
-                    pass
+            # Try to extract data from script tags first - more reliable.
+            # They are read straight from the raw bytes; a DOM is only built if this fails.
+            script_data = find_json_script(
+                response.content,
+                lambda data: isinstance(data, dict) and isinstance(data.get("data"), dict)
+            )
             
             # If we found structured data, use it
-            if script_data and "data" in script_data and "products" in script_data["data"]:
+            if script_data and "products" in script_data["data"]:
                 products = script_data["data"]["products"]
                 all_products = []
                 
-                for product in products[:10]:  # Get more to sort by popularity
+                for product in products[:MAX_CANDIDATES]:
                     try:
                         title = product.get("name", "Unknown Product")
                         slug = product.get("slug", "")
@@ -70,105 +87,38 @@ def search_tata1mg(encoded_query, query, user_agents, logger):
                 # Sort by popularity (rating * number of ratings)
                 all_products.sort(key=lambda x: x.get("popularity", 0), reverse=True)
                 
-                # Take top 5 products
-                for product in all_products[:5]:
-                    # Remove rating fields before returning
-                    if "rating" in product:
-                        del product["rating"]
-                    if "rating_count" in product:
-                        del product["rating_count"]
-                    if "popularity" in product:
-                        del product["popularity"]
-                    tata1mg_results.append(product)
+                # Keep the scores for the ranking stage
+                tata1mg_results.extend(all_products[:MAX_CANDIDATES])
+                strategy = "json"
             
             # Fallback to HTML scraping if API data not found
             if not tata1mg_results:
-                # Try multiple selectors
-                selectors = [
-                    ".style__product-box___3oEU6", 
-                    ".style__horizontal-card___1Zwmt",
-                    ".style__product-grid___3ZQ7D div[data-auto-id='product-grid-card']"
-                ]
+                soup = make_soup(response.text, "tata1mg_search")
                 
+                # Try multiple selectors
                 product_items = []
-                for selector in selectors:
-                    items = soup.select(selector)
+                for pattern in ITEM_PATTERNS:
+                    items = pattern.select(soup)
                     if items:
                         product_items = items
                         break
                 
                 all_products = []
                 
-                for item in product_items[:10]:  # Get more to sort by ratings/popularity
+                for item in product_items[:MAX_CANDIDATES]:
                     try:
-                        # Extract title
-                        title_selectors = [
-                            "[data-auto-id='product-name']", 
-                            ".style__pro-title___3zxNC",
-                            "a[title]", 
-                            ".style__product-title___1Pst1"
-                        ]
-                        
-                        title = "Unknown Product"
-                        for selector in title_selectors:
-                            title_elem = item.select_one(selector)
-                            if title_elem:
-                                title = title_elem.get_text(strip=True)
-                                if not title:
-                                    title = title_elem.get("title", "Unknown Product")
-                                break
+                        # One pass of the compiled item spec collects every field
+                        fields = extract(item, ITEM_SPEC)
+                        title = fields["title"]
+                        price = fields["price"]
+                        raw_price = parse_price(price)["sale_price"] or 0
+                        rating = fields["rating"]
+                        rating_count = fields["rating_count"]
                         
-                        # Extract link
-                        link_elem = item.select_one("a[href]")
-                        link = link_elem.get("href", "#") if link_elem else "#"
+                        link = fields["link"]
                         if link != "#" and not link.startswith("http"):
                             link = "https://www.1mg.com" + link
                         
-                        # Extract price
-                        price_selectors = [
-                            ".style__price-tag___B2csA", 
-                            ".style__discount-price___25Bya"
-                        ]
-                        
-                        price = "Price not available"
-                        raw_price = 0
-                        
-                        for selector in price_selectors:
-                            price_elem = item.select_one(selector)
-                            if price_elem:
-                                price_text = price_elem.get_text(strip=True)
-                                price = price_text
-                                try:
-                                    # Extract numeric price
-                                    raw_price = float(''.join(filter(lambda x: x.isdigit() or x == '.', price_text)))
-                                except ValueError:
-                                    raw_price = 0
-                                break
-                        
-                        # Extract rating
-                        rating = 0
-                        rating_count = 0
-                        
-                        rating_elem = item.select_one(".style__rating___1T2L8, .style__rating-wrap___2oUm3")
-                        if rating_elem:
-                            rating_text = rating_elem.get_text(strip=True)
-                            rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-                            if rating_match:
-                                try:
-                                    rating = float(rating_match.group(1))
-                                except ValueError:
-                                    rating = 0
-                        
-                        rating_count_elem = item.select_one(".style__rating-count___2oUm3")
-                        if rating_count_elem:
-                            count_text = rating_count_elem.get_text(strip=True)
-                            count_match = re.search(r'(\d+)', count_text)
-                            if count_match:
-                                try:
-                                    rating_count = int(count_match.group(1))
-                                except ValueError:
-                                    rating_count = 0
-                        
                         # Calculate popularity score
                         popularity = rating * (rating_count or 1)  # Avoid multiply by 0
                         
@@ -187,14 +137,18 @@ def search_tata1mg(encoded_query, query, user_agents, logger):
                 # Sort by popularity score
                 all_products.sort(key=lambda x: x.get("popularity", 0), reverse=True)
                 
-                # Take top 5 products
-                for product in all_products[:5]:
-                    if "popularity" in product:
-                        del product["popularity"]
-                    tata1mg_results.append(product)
+                # Keep the scores for the ranking stage
+                tata1mg_results.extend(all_products[:MAX_CANDIDATES])
+                strategy = "html"
+            answered = True
         else:
             logger.error(f"Tata 1mg returned status code: {response.status_code}")
     except Exception as e:
         logger.error(f"Tata 1mg search error: {str(e)}")
     
+    if not tata1mg_results:
+        strategy = "empty" if answered else "none"
+        if answered:
+            report_empty_page()
+    SCRAPER_STRATEGY.inc(source="Tata 1mg", strategy=strategy)
     return tata1mg_results
\ No newline at end of file
@@ -0,0 +1,184 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from flask import current_app
+
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+# A batch is committed once it holds MAX_BATCH writes or its first write has
+# waited MAX_DELAY seconds, whichever comes first
+MAX_BATCH = 200
+MAX_DELAY = 0.05
+# Seconds a request waits in flush_writes() before giving up
+FLUSH_TIMEOUT = 5
+
+
+class WriteBehindQueue:
+    """
+    Single writer for one database that applies queued writes in batched
+    transactions (group commit).
+
+    Request threads submit statements and return at once; a background
+    thread commits them in order, many to a transaction, so requests no
+    longer contend for SQLite's write lock and commits are shared. Writes
+    must not depend on being visible to the same request: they land at most
+    MAX_DELAY seconds (plus the commit) later. flush() waits until all
+    writes submitted before it are committed. If the writer thread dies,
+    the queue is marked dead: what it still held is dropped and logged,
+    waiting flushes return False and submit() raises.
+    """
+
+    def __init__(self, database, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._closed = False
+        self.dead = False
+        # Held while submitting and while the dead writer drains its queue,
+        # so nothing can be queued after the drain
+        self._state_lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql, params=()):
+        self.submit_many(sql, [params])
+
+    def submit_many(self, sql, seq_of_params):
+        with self._state_lock:
+            if self.dead:
+                raise RuntimeError(f"Write-behind writer for {self.database} is not running")
+            if self._closed:
+                raise RuntimeError("Write-behind queue is closed")
+            self._queue.put((sql, list(seq_of_params)))
+
+    def flush(self, timeout=None):
+        """Block until every write submitted so far is committed; False on timeout or if the writer died."""
+        done = threading.Event()
+        with self._state_lock:
+            if self.dead:
+                return False
+            self._queue.put(done)
+        return done.wait(timeout) and not self.dead
+
+    def close(self, timeout=10):
+        """Commit what is queued, checkpoint the WAL into the database file and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        """Block for the next write, then collect more until the batch is full or due."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        connections = get_pool(self.database)
+        db = None
+        try:
+            db = connections.acquire()
+            stopping = False
+            while not stopping:
+                batch = self._next_batch()
+                writes = [item for item in batch if isinstance(item, tuple)]
+                if writes:
+                    self._commit(db, writes)
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    elif item is None:
+                        stopping = True
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            logger.error(f"Write-behind writer for {self.database} stopped: {str(e)}")
+            self._mark_dead()
+        finally:
+            if db is not None:
+                connections.release(db)
+
+    def _mark_dead(self):
+        """Drop what is still queued and release every waiting flush."""
+        with self._state_lock:
+            self.dead = True
+            dropped = 0
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is not None:
+                    dropped += 1
+        if dropped:
+            logger.error(f"Dropped {dropped} queued writes for {self.database}")
+
+    def _commit(self, db, writes):
+        try:
+            with db:
+                for sql, seq_of_params in writes:
+                    db.executemany(sql, seq_of_params)
+        except Exception as e:
+            # One bad statement must not take the rest of the batch with it
+            logger.error(f"Batched write failed, retrying one by one: {str(e)}")
+            for sql, seq_of_params in writes:
+                try:
+                    with db:
+                        db.executemany(sql, seq_of_params)
+                except Exception as e:
+                    logger.error(f"Dropped queued write {sql!r}: {str(e)}")
+        self.batches += 1
+        self.writes += len(writes)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(database):
+    """The process-wide write-behind queue for `database`; a writer that died is replaced."""
+    with _writers_lock:
+        writer = _writers.get(database)
+        if writer is None or writer.dead:
+            writer = _writers[database] = WriteBehindQueue(database)
+        return writer
+
+
+def queue_write(sql, params=()):
+    """Queue a write to the current app's database."""
+    get_writer(current_app.config['DATABASE']).submit(sql, params)
+
+
+def queue_writes(sql, seq_of_params):
+    get_writer(current_app.config['DATABASE']).submit_many(sql, seq_of_params)
+
+
+def flush_writes(timeout=FLUSH_TIMEOUT):
+    """Wait for the current app's queued writes, e.g. before reading or deleting what they touch."""
+    return get_writer(current_app.config['DATABASE']).flush(timeout)
+
+
+@atexit.register
+def close_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()